@@ -1,15 +1,38 @@
 import sys
 import os
+import time
 import configparser
 import xml.etree.ElementTree as ET
 from PyQt6 import QtWidgets, QtCore, QtGui
-from PyQt6.QtWidgets import QMainWindow, QWidget, QLabel, QLineEdit, QTextEdit, QPushButton, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem, QSizePolicy, QDialog, QScrollArea, QCheckBox, QMessageBox, QFrame, QStatusBar, QApplication
+from PyQt6.QtWidgets import QMainWindow, QWidget, QLabel, QLineEdit, QTextEdit, QPushButton, QVBoxLayout, QHBoxLayout, QTreeView, QListView, QSplitter, QSizePolicy, QDialog, QScrollArea, QCheckBox, QMessageBox, QFrame, QStatusBar, QApplication, QFileDialog, QProgressBar
 from PyQt6.QtGui import QGuiApplication, QClipboard
-from message_parser import MessageParser
+from message_parser import MessageParser, ENGINE_NATIVE, ENGINE_QUICKFIX, ENGINES
+from fix_dictionary import DictionaryRegistry, read_version
+from message_tree_model import MessageTreeModel
+from decode_worker import DecodeThread
+from parse_timing import StageTimer, format_stages
+from message_list_model import MessageListModel
+from log_tail import LogTail
+from parser_loader import ParserLoader
+from message_history import MessageHistory, DEFAULT_INDEXED_TAGS
+from fix_query import QueryError
+from compact_message import CompactMessage
+from message_parser import DecodedMessage
+from fix_stream import RawMessage, split_text, detect_delimiter
+from order_chains import LINK_TAGS, UNKNOWN_IDS
 from typing import Tuple
 
 basedir = os.path.dirname(__file__)
 
+# Only the newest matches of a history search are listed
+HISTORY_SEARCH_LIMIT = 10000
+
+# Pasted messages waiting for the dictionaries to load, older ones are dropped beyond this
+QUEUED_DECODE_LIMIT = 10000
+
+# Messages with more fields than this only get their sections expanded, expanding everything would defeat lazy loading
+EXPAND_ALL_LIMIT = 2000
+
 try:
 	# Only applicable for Windows application
     from ctypes import windll
@@ -87,13 +110,17 @@ class AppWindow(QMainWindow):
 		# Setting up app config and initialize message parser
 		app_config_file_name = 'app_config.ini'
 		self.init_config(os.path.join(basedir, app_config_file_name))
-		self.msg_parser = self.build_msg_parser()
+		self.check_dictionary_paths()
+		# Set once the dictionaries are loaded, decodes requested before that are queued
+		self.msg_parser = None
+		self.queued_decodes = []
 
 		self.app = app
 		self.message_editor = MessageEditor()
 		self.init_ui()
 		self.init_logic()
 		self.show()
+		self.load_msg_parser()
 
 	def init_config(self, config_path: str):
 		app_config = configparser.ConfigParser()
@@ -121,6 +148,19 @@ class AppWindow(QMainWindow):
 			data_dictionary = config['DataDictionary'] if 'DataDictionary' in config else ''
 			self.data_dict_path = os.path.join(basedir, data_dictionary) if data_dictionary else ''
 			self.app_dict_path = None
+		self.parser_engine = config['ParserEngine'].lower() if 'ParserEngine' in config else ENGINE_NATIVE
+		if self.parser_engine not in ENGINES:
+			print(f"Unknown parser engine '{self.parser_engine}' in config, using {ENGINE_NATIVE}")
+			self.parser_engine = ENGINE_NATIVE
+		# Pick the dictionary for each message from its BeginString/ApplVerID among all dictionaries in DictionaryDir
+		dictionary_dir = config['DictionaryDir'] if 'DictionaryDir' in config else 'dictionaries'
+		self.dictionary_dir = os.path.join(basedir, dictionary_dir)
+		self.auto_select_dictionary = True
+		# Compiled dictionary snapshots are kept next to the config unless configured otherwise
+		dictionary_cache_dir = config['DictionaryCacheDir'] if 'DictionaryCacheDir' in config else 'dict_cache'
+		self.dict_cache_dir = os.path.join(os.path.dirname(config_path), dictionary_cache_dir) if dictionary_cache_dir else None
+		prebuilt_cache_dir = config['PrebuiltDictionaryCacheDir'] if 'PrebuiltDictionaryCacheDir' in config else 'dict_prebuilt'
+		self.prebuilt_cache_dir = os.path.join(basedir, prebuilt_cache_dir) if prebuilt_cache_dir else None
 		# Setting config with default values
 		self.always_on_top = False
 		self.expand_tree_on_launch = False
@@ -128,6 +168,18 @@ class AppWindow(QMainWindow):
 		self.is_right_align = False
 		self.start_pos = (0, 0)
 		self.start_size = (500, 600)
+		self.autopaste_debounce_ms = 150
+		self.decode_cache_entries = 256
+		self.decode_cache_mb = 64
+		self.parse_timings = False
+		self.validate_messages = False
+		self.history_size = 50000
+		self.history_indexed_tags = DEFAULT_INDEXED_TAGS
+		self.tail_buffer_size = 5000
+		self.tail_poll_ms = 200
+		self.decode_server_enabled = False
+		# Blank uses the default address of decode_server.py
+		self.decode_server_address = config['DecodeServerAddress'] if 'DecodeServerAddress' in config else ''
 		try:
 			if 'AlwaysOnTop' in config:
 				self.always_on_top = config.getboolean('AlwaysOnTop')
@@ -135,8 +187,32 @@ class AppWindow(QMainWindow):
 				self.expand_tree_on_launch = config.getboolean('ExpandOnLaunch')
 			if 'ErrorOnStatusbar' in config:
 				self.error_on_statusbar = config.getboolean('ErrorOnStatusbar')
+			if 'AutoSelectDictionary' in config:
+				self.auto_select_dictionary = config.getboolean('AutoSelectDictionary')
 			if 'IsRightAlign' in config:
 				self.is_right_align = config.getboolean('IsRightAlign')
+			if 'DecodeCacheEntries' in config:
+				self.decode_cache_entries = config.getint('DecodeCacheEntries')
+			if 'DecodeCacheMB' in config:
+				self.decode_cache_mb = config.getint('DecodeCacheMB')
+			if 'ParseTimings' in config:
+				self.parse_timings = config.getboolean('ParseTimings')
+			if 'ValidateMessages' in config:
+				self.validate_messages = config.getboolean('ValidateMessages')
+			if 'HistorySize' in config:
+				self.history_size = config.getint('HistorySize')
+			if 'HistoryIndexedTags' in config:
+				# 'all' indexes every tag, at several KB of index per message
+				indexed_tags = config['HistoryIndexedTags'].strip()
+				self.history_indexed_tags = None if indexed_tags.lower() == 'all' else frozenset(int(tag) for tag in indexed_tags.split(',') if tag.strip())
+			if 'DecodeServer' in config:
+				self.decode_server_enabled = config.getboolean('DecodeServer')
+			if 'TailBufferSize' in config:
+				self.tail_buffer_size = config.getint('TailBufferSize')
+			if 'TailPollMs' in config:
+				self.tail_poll_ms = config.getint('TailPollMs')
+			if 'AutoPasteDebounceMs' in config:
+				self.autopaste_debounce_ms = config.getint('AutoPasteDebounceMs')
 			start_pos_x = config.getint('StartPosX') if 'StartPosX' in config else self.start_pos[0]
 			start_pos_y = config.getint('StartPosY') if 'StartPosY' in config else self.start_pos[1]
 			self.start_pos = (start_pos_x, start_pos_y)
@@ -153,28 +229,73 @@ class AppWindow(QMainWindow):
 		# self.error_on_statusbar = True if error_on_statusbar and error_on_statusbar == 'Yes' else False
 
 		# Set other initial configs for the app
+		self.stage_timer = StageTimer()
 		self.is_compact = False
 		self.is_autocompact = False
 
 
-	def build_msg_parser(self):
-		try:
-			if self.data_dict_path or self.app_dict_path:
-				return MessageParser(self.data_dict_path, self.app_dict_path)
-		except Exception as e:
-			print(e)
-			QMessageBox.warning(self, "Error",
-				f"""<p>Could not parse quickfix dictionary file at specified path. Please check the dictionary path in config file.</p>
-				<p>Application will now exit.</p>""",
-				QMessageBox.StandardButton.Ok)
-			sys.exit()
+	def build_dictionary_registry(self):
+		if not self.auto_select_dictionary or not os.path.isdir(self.dictionary_dir):
+			return None
+		# FIXT messages without ApplVerID are decoded with the configured application dictionary
+		default_appl_version = read_version(self.app_dict_path) if self.app_dict_path else None
+		return DictionaryRegistry.from_directory(self.dictionary_dir, default_appl_version, self.dict_cache_dir, self.prebuilt_cache_dir)
 
+	def check_dictionary_paths(self):
+		if self.data_dict_path or self.app_dict_path:
+			return
 		QMessageBox.warning(self, "Error",
 			f"""<p>Quickfix dictionary path incorrectly set. Please check the config file.</p>
 			<p>Application will now exit.</p>""",
 			QMessageBox.StandardButton.Ok)
 		sys.exit()
 
+	def build_msg_parser(self, engine: str = None, timed: bool = True):
+		# Also called on the parser loader thread, so it only reads config attributes.
+		# Parsers that are not the viewer's own are built untimed, so they stay out of the exported timings.
+		# Batch and followed log decodes use msg_parser.untimed() for the same reason.
+		stage_timer = self.stage_timer if timed and self.parse_timings else None
+		return MessageParser(self.data_dict_path, self.app_dict_path, engine if engine else self.parser_engine, self.dict_cache_dir, self.prebuilt_cache_dir, self.build_dictionary_registry(), self.decode_cache_entries, self.decode_cache_mb * 1024 * 1024, stage_timer)
+
+	def load_msg_parser(self):
+		# Dictionaries are loaded after the window is shown, with a busy indicator in the status bar until they are ready
+		self.load_progress.setVisible(True)
+		self.parser_loader = ParserLoader(self.build_msg_parser)
+		self.parser_loader.worker.progress.connect(self.show_status_bar_msg)
+		self.parser_loader.worker.loaded.connect(self.on_parser_loaded)
+		self.parser_loader.worker.failed.connect(self.on_parser_load_failed)
+		self.app.aboutToQuit.connect(self.parser_loader.stop)
+		self.parser_loader.start()
+
+	def on_parser_loaded(self, msg_parser: MessageParser, seconds: float):
+		self.msg_parser = msg_parser
+		self.load_progress.setVisible(False)
+		self.show_status_bar_msg(f'Dictionaries loaded ({seconds:.2f} s)')
+		if self.decode_server_enabled:
+			self.start_decode_server()
+		self.run_queued_decodes()
+
+	def on_parser_load_failed(self, error_msg: str):
+		print(error_msg)
+		QMessageBox.warning(self, "Error",
+			f"""<p>Could not parse quickfix dictionary file at specified path. Please check the dictionary path in config file.</p>
+			<p>Application will now exit.</p>""",
+			QMessageBox.StandardButton.Ok)
+		self.app.exit(1)
+
+	def run_queued_decodes(self):
+		if not self.queued_decodes:
+			return
+		queued, self.queued_decodes = self.queued_decodes, []
+		if len(queued) > 1:
+			# Everything pasted meanwhile is decoded as one batch into the message list, ending on the latest paste
+			self.decode_batch([RawMessage(offset, msg, delim) for offset, (msg, delim) in enumerate(queued)], select_last=True)
+			return
+		msg, delim = queued[0]
+		self.msg_line.setText(msg)
+		self.msg_delim_edit.setText(delim)
+		self.decode_and_show_msg()
+
 	def init_ui(self):
 		self.setObjectName('MainWindow')
 		self.setWindowTitle('FIXV')
@@ -240,9 +361,28 @@ class AppWindow(QMainWindow):
 		actions_hbox = QHBoxLayout()
 		parse_button = QPushButton('Re-Parse')
 
-		output_tree = QTreeWidget()
-		output_tree.setColumnCount(3)
-		output_tree.setHeaderLabels(['Tag', 'Name', 'Value'])
+		# Session history above the tree, listing recent messages or the results of a search
+		history_container = QWidget()
+		history_vbox = QVBoxLayout()
+		history_vbox.setContentsMargins(0, 0, 0, 0)
+		history_vbox.setSpacing(5)
+		history_search_edit = QLineEdit()
+		history_search_edit.setPlaceholderText('Search history, e.g. 35=D and 55=MSFT and 38>5000')
+		history_search_edit.setClearButtonEnabled(True)
+		message_list_model = MessageListModel(self.tail_buffer_size)
+		search_results_model = MessageListModel(None)
+		message_list = QListView()
+		message_list.setModel(message_list_model)
+		message_list.setUniformItemSizes(True)
+		history_container.setLayout(history_vbox)
+		history_vbox.addWidget(history_search_edit)
+		history_vbox.addWidget(message_list)
+		history_container.setVisible(False)
+
+		output_model = MessageTreeModel()
+		output_tree = QTreeView()
+		output_tree.setModel(output_model)
+		output_tree.setUniformRowHeights(True)
 
 		CENTRAL_VBOX = True
 		COMPACT_VBOX = True
@@ -298,7 +438,11 @@ class AppWindow(QMainWindow):
 					actions_hbox.addWidget(parse_button)
 					actions_hbox.addStretch()
 
-				viewer_vbox.addWidget(output_tree)
+				output_splitter = QSplitter(QtCore.Qt.Orientation.Vertical)
+				output_splitter.addWidget(history_container)
+				output_splitter.addWidget(output_tree)
+				output_splitter.setStretchFactor(1, 2)
+				viewer_vbox.addWidget(output_splitter)
 
 
 		## Export variable to self
@@ -316,8 +460,21 @@ class AppWindow(QMainWindow):
 		self.msg_line = msg_line
 		self.msg_delim_edit = msg_delim_edit
 		self.output_tree = output_tree
+		self.output_model = output_model
+		self.message_list = message_list
+		self.message_list_model = message_list_model
+		self.search_results_model = search_results_model
+		self.history_container = history_container
+		self.history_search_edit = history_search_edit
+		self.history = MessageHistory(self.history_size, self.history_indexed_tags)
 		self.clipboard = QGuiApplication.clipboard()
 		self.statusBar = QStatusBar()
+		# Busy indicator while the dictionaries load
+		self.load_progress = QProgressBar()
+		self.load_progress.setRange(0, 0)
+		self.load_progress.setMaximumWidth(80)
+		self.load_progress.setVisible(False)
+		self.statusBar.addPermanentWidget(self.load_progress)
 
 	def setup_actions(self):
 		self.auto_compact_act = QtGui.QAction('&Auto Compact')
@@ -347,16 +504,63 @@ class AppWindow(QMainWindow):
 		else:
 			self.show_err_msg_act.setChecked(True)
 			self.change_error_notification(self.show_err_msg_act)
+		self.native_parser_act = QtGui.QAction('&Native')
+		self.native_parser_act.setCheckable(True)
+		self.quickfix_parser_act = QtGui.QAction('&Quickfix')
+		self.quickfix_parser_act.setCheckable(True)
+		self.parser_act_grp = QtGui.QActionGroup(self)
+		self.parser_act_grp.addAction(self.native_parser_act)
+		self.parser_act_grp.addAction(self.quickfix_parser_act)
+		if self.parser_engine == ENGINE_QUICKFIX:
+			self.quickfix_parser_act.setChecked(True)
+		else:
+			self.native_parser_act.setChecked(True)
+		self.parser_act_grp.triggered.connect(self.change_parser_engine)
+		self.parse_timings_act = QtGui.QAction('Parse &Timings')
+		self.parse_timings_act.setCheckable(True)
+		self.parse_timings_act.setChecked(self.parse_timings)
+		self.parse_timings_act.toggled.connect(self.toggle_parse_timings)
+		self.validate_messages_act = QtGui.QAction('&Validate Messages')
+		self.validate_messages_act.setCheckable(True)
+		self.validate_messages_act.setChecked(self.validate_messages)
+		self.validate_messages_act.toggled.connect(self.toggle_validate_messages)
+		self.show_history_act = QtGui.QAction('Show &History')
+		self.show_history_act.setCheckable(True)
+		self.show_history_act.setShortcut('Ctrl+H')
+		self.show_history_act.toggled.connect(self.toggle_history)
+		self.order_chain_act = QtGui.QAction('Show &Order Chain')
+		self.order_chain_act.setShortcut('Ctrl+L')
+		self.order_chain_act.triggered.connect(self.show_order_chain)
+		self.follow_file_act = QtGui.QAction('&Follow Log File...')
+		self.follow_file_act.setShortcut('Ctrl+F')
+		self.follow_file_act.triggered.connect(self.choose_follow_file)
+		self.stop_follow_act = QtGui.QAction('&Stop Following')
+		self.stop_follow_act.setEnabled(False)
+		self.stop_follow_act.triggered.connect(self.stop_follow_file)
+		self.export_timings_act = QtGui.QAction('&Export Timings...')
+		self.export_timings_act.triggered.connect(self.export_parse_timings)
 
 	def setup_menu(self):
 		edit_menu = self.menuBar().addMenu('Edit')
 		edit_menu.addAction(self.edit_message_act)
+		edit_menu.addAction(self.order_chain_act)
+		edit_menu.addSeparator()
+		edit_menu.addAction(self.follow_file_act)
+		edit_menu.addAction(self.stop_follow_act)
 		view_menu = self.menuBar().addMenu('View')
 		view_menu.addAction(self.auto_compact_act)
 		view_menu.addAction(self.always_top_act)
+		view_menu.addAction(self.show_history_act)
 		error_menu = view_menu.addMenu('Error')
 		error_menu.addAction(self.show_err_msg_act)
 		error_menu.addAction(self.show_err_status_act)
+		parser_menu = view_menu.addMenu('Parser')
+		parser_menu.addAction(self.native_parser_act)
+		parser_menu.addAction(self.quickfix_parser_act)
+		parser_menu.addSeparator()
+		parser_menu.addAction(self.parse_timings_act)
+		parser_menu.addAction(self.validate_messages_act)
+		parser_menu.addAction(self.export_timings_act)
 
 	def init_logic(self):
 		self.message_editor.apply_signal.connect(self.apply_message_editor)
@@ -382,6 +586,28 @@ class AppWindow(QMainWindow):
 
 		self.setStatusBar(self.statusBar)
 
+		# Decoding runs off the GUI thread, only the result of the latest request is shown
+		self.decode_request_id = 0
+		self.decode_thread = DecodeThread(self)
+		self.decode_thread.worker.finished.connect(self.on_decode_finished)
+		self.decode_thread.worker.batch_finished.connect(self.on_batch_decode_finished)
+		self.app.aboutToQuit.connect(self.decode_thread.stop)
+		self.log_tail = None
+		self.app.aboutToQuit.connect(self.stop_follow_file)
+		# Started once the dictionaries are loaded
+		self.decode_server = None
+		# Clicking or moving through the list with the keyboard shows the selected message
+		self.list_shown = None
+		self.message_list.clicked.connect(self.show_list_message)
+		self.message_list.selectionModel().currentChanged.connect(self.on_list_current_changed)
+		self.history_search_edit.returnPressed.connect(self.search_history)
+		self.history_search_edit.textChanged.connect(self.reset_history_search)
+		# Clipboard bursts only trigger one decode once they settle
+		self.autopaste_timer = QtCore.QTimer(self)
+		self.autopaste_timer.setSingleShot(True)
+		self.autopaste_timer.setInterval(self.autopaste_debounce_ms)
+		self.autopaste_timer.timeout.connect(self.autopaste_decode)
+
 	def toggle_compact(self, is_compact: bool):
 		if self.message_editor.isVisible():
 			return
@@ -406,6 +632,21 @@ class AppWindow(QMainWindow):
 		if self.is_right_align:
 			self.move(right_edge_x - self.size().width(), self.pos().y())
 
+	def start_decode_server(self):
+		# Imported here since most sessions never host a server
+		from decode_server import DecodeServer
+		# The server decodes with its own parser on its own thread, the viewer's parser is never shared.
+		# The dictionaries are already loaded by then and shared between both parsers.
+		server = DecodeServer(self.build_msg_parser(timed=False), self.decode_server_address)
+		try:
+			server.start_in_thread()
+		except OSError as error:
+			self.show_status_bar_msg(f'Decode server not started: {error}')
+			return
+		self.decode_server = server
+		self.app.aboutToQuit.connect(server.stop)
+		self.show_status_bar_msg(f'Decode server listening on {server.address}')
+
 	def toggle_stays_on_top(self, checked):
 		self.setWindowFlag(QtCore.Qt.WindowType.WindowStaysOnTopHint, checked)
 		self.message_editor.setWindowFlag(QtCore.Qt.WindowType.WindowStaysOnTopHint, checked)
@@ -419,16 +660,61 @@ class AppWindow(QMainWindow):
 		elif qaction == self.show_err_status_act:
 			self.is_show_err_status = True
 
+	def change_parser_engine(self, qaction: QtGui.QAction):
+		engine = ENGINE_QUICKFIX if qaction == self.quickfix_parser_act else ENGINE_NATIVE
+		if self.msg_parser is None:
+			(self.quickfix_parser_act if self.parser_engine == ENGINE_QUICKFIX else self.native_parser_act).setChecked(True)
+			self.show_status_bar_msg('Dictionaries are still loading')
+			return
+		if engine == self.msg_parser.engine:
+			return
+		try:
+			self.msg_parser = self.build_msg_parser(engine)
+			self.parser_engine = engine
+			self.show_status_bar_msg(f'Switched to {engine} parser')
+		except Exception as error:
+			# Keep using the current parser and restore the menu selection
+			(self.quickfix_parser_act if self.parser_engine == ENGINE_QUICKFIX else self.native_parser_act).setChecked(True)
+			self.show_status_bar_msg(f'[{type(error).__name__}Error] {error}')
+
+	def toggle_parse_timings(self, checked: bool):
+		self.parse_timings = checked
+		if self.msg_parser is not None:
+			self.msg_parser.stage_timer = self.stage_timer if checked else None
+
+	def toggle_validate_messages(self, checked: bool):
+		self.validate_messages = checked
+		if checked and self.parser_engine != ENGINE_NATIVE:
+			self.show_status_bar_msg('Validation needs the native parser engine')
+			return
+		if self.msg_line.toPlainText():
+			self.decode_and_show_msg()
+
+	def export_parse_timings(self):
+		export_path, _ = QFileDialog.getSaveFileName(self, 'Export Parse Timings', 'parse_timings.json', 'JSON (*.json)')
+		if not export_path:
+			return
+		try:
+			self.stage_timer.export(export_path)
+			self.show_status_bar_msg(f'Exported parse timings to {export_path}')
+		except OSError as error:
+			self.show_status_bar_msg(f'[{type(error).__name__}Error] {error}')
+
 	def autopaste_decode(self):
 		if self.message_editor.isVisible():
 			return
 		self.paste_and_decode()
 
+	def schedule_autopaste(self, *args):
+		# Restarting the timer on every change debounces the burst
+		self.autopaste_timer.start()
+
 	def toggle_autopaste(self, checked: bool):
 		if checked:
-			self.clipboard.changed.connect(self.autopaste_decode)
+			self.clipboard.changed.connect(self.schedule_autopaste)
 		else:
-			self.clipboard.changed.disconnect(self.autopaste_decode)
+			self.clipboard.changed.disconnect(self.schedule_autopaste)
+			self.autopaste_timer.stop()
 
 	def changeEvent(self, e: QtCore.QEvent) -> None:
 		if e.type() == QtCore.QEvent.Type.ActivationChange:
@@ -455,25 +741,233 @@ class AppWindow(QMainWindow):
 		self.message_editor.close()
 		self.decode_and_show_msg()
 
+	def choose_follow_file(self):
+		log_path, _ = QFileDialog.getOpenFileName(self, 'Follow Log File')
+		if log_path:
+			self.follow_file(log_path)
+
+	def follow_file(self, log_path: str):
+		if self.msg_parser is None:
+			self.show_status_bar_msg('Dictionaries are still loading')
+			return
+		self.stop_follow_file()
+		self.show_history_act.setChecked(True)
+		self.log_tail = LogTail(self.msg_parser.untimed(), log_path, self.tail_poll_ms, self.tail_buffer_size)
+		self.log_tail.worker.batch_ready.connect(self.append_followed_messages)
+		self.log_tail.worker.failed.connect(self.show_status_bar_msg)
+		self.log_tail.start()
+		self.stop_follow_act.setEnabled(True)
+		self.show_status_bar_msg(f'Following {os.path.basename(log_path)}')
+
+	def stop_follow_file(self):
+		if self.log_tail is None:
+			return
+		self.log_tail.stop()
+		self.log_tail = None
+		self.stop_follow_act.setEnabled(False)
+
+	def append_followed_messages(self, messages: list):
+		# Whole batches are added at once so bursts cost one view update per poll
+		scroll_bar = self.message_list.verticalScrollBar()
+		at_bottom = scroll_bar.value() == scroll_bar.maximum()
+		self.history.add_many(messages)
+		self.message_list_model.append_messages(messages)
+		if at_bottom and self.message_list.model() is self.message_list_model:
+			self.message_list.scrollToBottom()
+		if self.log_tail:
+			self.show_status_bar_msg(f'Following {os.path.basename(self.log_tail.path)}: {len(self.message_list_model.messages)} recent messages')
+
+	def toggle_history(self, checked: bool):
+		self.history_container.setVisible(checked)
+
+	def add_to_history(self, decoded: DecodedMessage):
+		# Re-parsing or re-pasting the same message does not create a new entry
+		last = self.history.last()
+		if last is not None and last.raw == decoded.raw:
+			return
+		self.history.add(decoded)
+		self.message_list_model.append_messages([decoded])
+
+	def search_history(self):
+		query = self.history_search_edit.text()
+		if not query.strip():
+			self.reset_history_search(query)
+			return
+		if self.msg_parser is None:
+			self.show_status_bar_msg('Dictionaries are still loading')
+			return
+		try:
+			fix_query = self.msg_parser.compile_query(query)
+		except QueryError as error:
+			self.show_status_bar_msg(f'[QueryError] {error}')
+			return
+		start = time.perf_counter()
+		results = self.history.search_query(fix_query, HISTORY_SEARCH_LIMIT)
+		elapsed_ms = (time.perf_counter() - start) * 1000
+		self.search_results_model.set_messages(results)
+		self.set_list_model(self.search_results_model)
+		self.show_status_bar_msg(f'{len(results)} of {len(self.history)} messages match ({elapsed_ms:.1f} ms)')
+
+	def reset_history_search(self, text: str):
+		if not text.strip() and self.message_list.model() is not self.message_list_model:
+			self.set_list_model(self.message_list_model)
+			self.search_results_model.clear()
+
+	def show_order_chain(self):
+		# Lists every message of the shown message's order (new, replaces, fills, cancel) to step through like search results
+		if self.list_shown is not None and self.list_shown[1] == self.decode_request_id:
+			decoded = self.list_shown[0]
+		else:
+			decoded = self.history.last()
+		if decoded is None or decoded.tree is None:
+			self.show_status_bar_msg('No decoded message to follow')
+			return
+		start = time.perf_counter()
+		chain = self.history.order_chain(decoded)
+		elapsed_ms = (time.perf_counter() - start) * 1000
+		if not chain:
+			self.show_status_bar_msg('Not an order message with a ClOrdID, OrigClOrdID or OrderID')
+			return
+		# The search field shows an equivalent query, clearing it goes back to the full history
+		ids = sorted({pair for entry in chain for pair in self.history.field_pairs(entry) if pair[0] in LINK_TAGS and pair[1] not in UNKNOWN_IDS})
+		self.history_search_edit.setText(' or '.join(f'{tag}={value}' if value.isalnum() else f'{tag}="{value}"' for tag, value in ids))
+		self.search_results_model.set_messages(chain)
+		self.set_list_model(self.search_results_model)
+		self.show_history_act.setChecked(True)
+		row = next((row for row, entry in enumerate(chain) if entry is decoded), 0)
+		self.message_list.setCurrentIndex(self.search_results_model.index(row))
+		self.show_status_bar_msg(f'Order chain of {len(chain)} messages ({elapsed_ms:.1f} ms)')
+
+	def set_list_model(self, model: MessageListModel):
+		# Every model gets a new selection model, so the current row signal is connected again
+		previous_selection = self.message_list.selectionModel()
+		self.message_list.setModel(model)
+		if self.message_list.selectionModel() is not previous_selection:
+			previous_selection.deleteLater()
+			self.message_list.selectionModel().currentChanged.connect(self.on_list_current_changed)
+
+	def on_list_current_changed(self, current: QtCore.QModelIndex, previous: QtCore.QModelIndex):
+		self.show_list_message(current)
+
+	def show_list_message(self, index: QtCore.QModelIndex):
+		if not index.isValid():
+			return
+		decoded = self.message_list.model().message(index.row())
+		# A click on the row that is already shown does not render it again
+		if self.list_shown is not None and self.list_shown[0] is decoded and self.list_shown[1] == self.decode_request_id:
+			return
+		# Drop any decode still in flight so it does not replace the selected message
+		self.decode_request_id += 1
+		self.list_shown = (decoded, self.decode_request_id)
+		self.msg_line.setText(decoded.raw)
+		if decoded.delim != '\x01':
+			self.msg_delim_edit.setText(decoded.delim)
+		# Batches and the followed log are decoded without validation, the selected message is checked like a single paste
+		issues = None
+		error = decoded.error
+		if self.validate_messages and isinstance(decoded.tree, CompactMessage):
+			try:
+				issues = self.msg_parser.validate_compact(decoded.tree)
+			except Exception as validate_error:
+				error = validate_error
+		self.show_decoded_msg(self.decode_request_id, decoded.tree, error, None, issues)
+
 	def show_status_bar_msg(self, msg: str):
 		self.statusBar.clearMessage()
 		self.statusBar.showMessage(msg)
 		self.statusBar.setToolTip(msg)
 
 	def paste_and_decode(self):
-		self.msg_line.setText(get_clipboard(self.clipboard).replace('\n', '').replace('\r', ''))
+		text = get_clipboard(self.clipboard)
+		messages = split_text(text)
+		if len(messages) > 1:
+			self.decode_batch(messages)
+			return
+		self.msg_line.setText(text.replace('\n', '').replace('\r', ''))
 		self.decode_and_show_msg()
 
+	def decode_batch(self, messages: list, select_last: bool = False):
+		# Several pasted messages are decoded together on the decode thread and listed, only the selected one gets a tree
+		if self.msg_parser is None:
+			self.queued_decodes.extend((message.text, message.delim) for message in messages)
+			del self.queued_decodes[:-QUEUED_DECODE_LIMIT]
+			self.show_status_bar_msg(f'Loading dictionaries, {len(self.queued_decodes)} queued')
+			return
+		self.decode_request_id += 1
+		self.batch_start = time.perf_counter()
+		self.batch_select_last = select_last
+		self.decode_thread.worker.submit_batch(self.decode_request_id, self.msg_parser.untimed(), messages)
+		self.show_status_bar_msg(f'Parsing {len(messages)} messages...')
+
+	def on_batch_decode_finished(self, request_id: int, messages: list):
+		if request_id != self.decode_request_id:
+			return
+		elapsed_ms = (time.perf_counter() - self.batch_start) * 1000
+		self.history.add_many(messages)
+		# Listed in full history order, so a running search is cleared first
+		if self.message_list.model() is not self.message_list_model:
+			self.history_search_edit.clear()
+		self.message_list_model.append_messages(messages)
+		self.show_history_act.setChecked(True)
+		errors = sum(1 for decoded in messages if decoded.tree is None)
+		count = len(self.message_list_model.messages)
+		if self.batch_select_last:
+			selected = self.message_list_model.index(count - 1)
+			scroll_hint = QtWidgets.QAbstractItemView.ScrollHint.PositionAtBottom
+		else:
+			selected = self.message_list_model.index(max(count - len(messages), 0))
+			scroll_hint = QtWidgets.QAbstractItemView.ScrollHint.PositionAtTop
+		self.message_list.setCurrentIndex(selected)
+		self.message_list.scrollTo(selected, scroll_hint)
+		# The current row may not have changed when the list was full, in which case the signal did not show it
+		self.show_list_message(selected)
+		self.show_status_bar_msg(f"Parsed {len(messages)} messages ({elapsed_ms:.0f} ms){f', {errors} failed' if errors else ''}")
+
 	def decode_and_show_msg(self):
 		if not self.msg_line.toPlainText():
 			self.show_status_bar_msg('Nothing to parse')
 			return
+		if self.msg_parser is None:
+			self.queued_decodes.append((self.msg_line.toPlainText(), self.msg_delim_edit.text() if self.msg_delim_edit.text() else '|'))
+			del self.queued_decodes[:-QUEUED_DECODE_LIMIT]
+			self.show_status_bar_msg(f'Loading dictionaries, {len(self.queued_decodes)} queued')
+			return
+		self.decode_request_id += 1
+		validate = self.validate_messages and self.msg_parser.engine == ENGINE_NATIVE
+		self.decode_thread.worker.submit(self.decode_request_id, self.msg_parser, self.msg_line.toPlainText(), self.msg_delim_edit.text() if self.msg_delim_edit.text() else '|', validate)
+		self.show_status_bar_msg('Parsing...')
+
+	def on_decode_finished(self, request_id: int, msg_tree: ET.Element, error: Exception, timings: dict, issues: list):
+		# Results of superseded requests are dropped
+		if request_id != self.decode_request_id:
+			return
+		if msg_tree is not None:
+			# Stored with the delimiter the message uses, an SOH paste would never match a query split on the box's '|'
+			raw = self.msg_line.toPlainText()
+			self.add_to_history(DecodedMessage(0, raw, detect_delimiter(raw, self.msg_delim_edit.text() if self.msg_delim_edit.text() else '|'), msg_tree, None))
+		self.show_decoded_msg(request_id, msg_tree, error, timings, issues)
+
+	def show_decoded_msg(self, request_id: int, msg_tree: ET.Element, error: Exception, timings: dict, issues: list = None):
+		# Results of superseded requests are dropped
+		if request_id != self.decode_request_id:
+			return
 		try:
-			self.output_tree.clear()
-			msg_tree = self.msg_parser.parse_msg(self.msg_line.toPlainText(), self.msg_delim_edit.text() if self.msg_delim_edit.text() else '|')
-			self.build_output_tree(msg_tree)
-			self.show_status_bar_msg('Successfully parsed')
+			if error is not None:
+				raise error
+			status = 'Successfully parsed'
+			if issues is not None:
+				status += f", {len(issues)} validation problem{'s' if len(issues) != 1 else ''}" if issues else ', no validation problems'
+			if timings is None:
+				self.build_output_tree(msg_tree, issues)
+				self.show_status_bar_msg(status)
+				return
+			tree_start = time.perf_counter()
+			self.build_output_tree(msg_tree, issues)
+			tree_timing = {'build_output_tree': time.perf_counter() - tree_start}
+			self.stage_timer.record(tree_timing)
+			self.show_status_bar_msg(f'{status} ({format_stages({**timings, **tree_timing})})')
 		except Exception as error:
+			self.output_model.clear()
 			error_msg = f'[{type(error).__name__}Error] {error}'
 			if self.is_show_err_msg:
 				QMessageBox.warning(self, "Error", f"""<h2>Message Parsing Error</h2>
@@ -481,47 +975,18 @@ class AppWindow(QMainWindow):
 			elif self.is_show_err_status:
 				self.show_status_bar_msg(error_msg)
 
-	def build_output_tree(self, msg_tree: ET.Element):
-		for section in msg_tree.iterfind('./'):
-			section_item = QTreeWidgetItem([section.tag])
-			self.output_tree.addTopLevelItem(section_item)
-			section_item.setExpanded(self.expand_tree_on_launch)
-			self.build_tree_item(section, section_item)
+	def build_output_tree(self, msg_tree, issues: list = None):
+		self.output_model.set_message(msg_tree, issues)
+		if self.expand_tree_on_launch:
+			size = len(msg_tree) if isinstance(msg_tree, CompactMessage) else sum(1 for _ in msg_tree.iter())
+			if size <= EXPAND_ALL_LIMIT:
+				self.output_tree.expandAll()
+			else:
+				self.output_tree.expandToDepth(0)
 		# Only resize the first and second column
 		for i in range(2):
 			self.output_tree.resizeColumnToContents(i)
 
-	def build_tree_item(self, msg_elem: ET.Element, tree_parent: QTreeWidgetItem):
-		for elem in msg_elem.iterfind('./'):
-			field_tag = elem.get('number') if 'number' in elem.attrib else elem.tag
-			if elem.tag == 'field':
-				field_name = elem.get('name') if 'name' in elem.attrib else 'UNDEFINED'
-			else:
-				field_name = elem.get('name') if 'name' in elem.attrib else None
-			field_raw = elem.get('raw') if 'raw' in elem.attrib else None
-			field_enum = elem.get('enum') if 'enum' in elem.attrib else None
-			field_value = None
-			if field_raw:
-				if field_enum:
-					field_value = f'{field_raw} ({field_enum})'
-				else:
-					field_value = field_raw
-			item_entries = [field_tag]
-			if field_name:
-				item_entries.append(field_name)
-			if field_value:
-				if len(item_entries) < 2:
-					item_entries.append('')
-				item_entries.append(field_value)
-			if len(item_entries) > 3:
-				print(f'[WARNING] Row for {field_tag} contains more than 3 entries')
-			tree_item = QTreeWidgetItem(item_entries)
-			if len(item_entries) == 3:
-				tree_item.setToolTip(2, field_value)
-			tree_parent.addChild(tree_item)
-			self.build_tree_item(elem, tree_item)
-			tree_item.setExpanded(self.expand_tree_on_launch)
-
 if __name__ == "__main__":
 
 	app = QtWidgets.QApplication(sys.argv)
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+
+benchdir = os.path.dirname(os.path.abspath(__file__))
+basedir = os.path.join(benchdir, '..')
+sys.path.insert(0, basedir)
+
+from message_parser import MessageParser, ENGINE_NATIVE, ENGINE_QUICKFIX, has_quickfix
+from fix_dictionary import load_dictionary
+from synthetic_messages import MessageGenerator, deepest_message_types
+
+try:
+	from message_tree_model import row_entries
+except ImportError:
+	# Tree building needs PyQt6, parsing is still benchmarked without it
+	row_entries = None
+
+# (dictionary, application dictionary) per benchmarked FIX version
+VERSIONS = {
+	'FIX42': ('FIX42.xml', None),
+	'FIX44': ('FIX44.xml', None),
+	'FIX50SP2': ('FIXT11.xml', 'FIX50SP2.xml'),
+}
+# (body field count, group depth, group width)
+SHAPES = [(10, 0, 0), (40, 1, 4), (40, 2, 8), (80, 3, 16)]
+
+def time_call(func, min_time: float, repeat: int) -> list:
+	# Per call timings in microseconds, each repeat runs long enough to rise above timer noise
+	number = 1
+	while True:
+		start = time.perf_counter()
+		for _ in range(number):
+			func()
+		elapsed = time.perf_counter() - start
+		if elapsed >= min_time:
+			break
+		number *= 2
+	samples = [elapsed / number]
+	for _ in range(repeat - 1):
+		start = time.perf_counter()
+		for _ in range(number):
+			func()
+		samples.append((time.perf_counter() - start) / number)
+	return [sample * 1e6 for sample in samples]
+
+def build_tree(msg_tree):
+	# Walks every element the way a fully expanded view would
+	for elem in msg_tree.iter():
+		row_entries(elem)
+
+def run_case(msg_parser: MessageParser, msg: str, min_time: float, repeat: int) -> dict:
+	msg_tree = msg_parser.parse_msg(msg, '\x01')
+	parse_us = time_call(lambda: msg_parser.parse_msg(msg, '\x01'), min_time, repeat)
+	result = {
+		'msg_bytes': len(msg),
+		'fields': msg.count('\x01'),
+		'parse_us_median': statistics.median(parse_us),
+		'parse_us_min': min(parse_us),
+	}
+	if msg_parser.engine == ENGINE_NATIVE:
+		compact_us = time_call(lambda: msg_parser.parse_msg_compact(msg, '\x01'), min_time, repeat)
+		result['compact_us_median'] = statistics.median(compact_us)
+		result['compact_us_min'] = min(compact_us)
+	if row_entries:
+		tree_us = time_call(lambda: build_tree(msg_tree), min_time, repeat)
+		result['tree_us_median'] = statistics.median(tree_us)
+		result['tree_us_min'] = min(tree_us)
+	return result
+
+def run_benchmarks(versions: list, engines: list, msg_types_per_version: int, min_time: float, repeat: int) -> list:
+	results = []
+	dictionary_dir = os.path.join(basedir, 'dictionaries')
+	for version in versions:
+		dict_file, app_dict_file = VERSIONS[version]
+		dict_path = os.path.join(dictionary_dir, dict_file)
+		app_dict_path = os.path.join(dictionary_dir, app_dict_file) if app_dict_file else None
+		fix_dict = load_dictionary(app_dict_path if app_dict_path else dict_path)
+		generator = MessageGenerator(fix_dict, load_dictionary(dict_path) if app_dict_path else None)
+		msg_types = ['D', '8'] + [msg_type for msg_type in deepest_message_types(fix_dict, msg_types_per_version) if msg_type not in ('D', '8')]
+		for engine in engines:
+			msg_parser = MessageParser(dict_path, app_dict_path, engine)
+			for msg_type in msg_types:
+				for field_count, group_depth, group_width in SHAPES:
+					msg = generator.generate(msg_type, field_count, group_depth, group_width)
+					result = {
+						'version': version,
+						'engine': engine,
+						'msg_type': msg_type,
+						'field_count': field_count,
+						'group_depth': group_depth,
+						'group_width': group_width,
+					}
+					result.update(run_case(msg_parser, msg, min_time, repeat))
+					results.append(result)
+					print(f"{version:9} {engine:8} 35={msg_type:3} shape={field_count}/{group_depth}/{group_width:<3} fields={result['fields']:<6} parse={result['parse_us_median']:10.1f} us" + (f"  compact={result['compact_us_median']:10.1f} us" if 'compact_us_median' in result else '') + (f"  tree={result['tree_us_median']:10.1f} us" if 'tree_us_median' in result else ''), file=sys.stderr)
+	return results
+
+def case_key(result: dict) -> tuple:
+	return (result['version'], result['engine'], result['msg_type'], result['field_count'], result['group_depth'], result['group_width'])
+
+def compare_results(results: list, baseline_path: str, threshold: float) -> list:
+	with open(baseline_path) as baseline_file:
+		baseline = {case_key(result): result for result in json.load(baseline_file)['results']}
+	regressions = []
+	for result in results:
+		previous = baseline.get(case_key(result))
+		if previous is None:
+			continue
+		for metric in ('parse_us_median', 'compact_us_median', 'tree_us_median'):
+			if metric in result and metric in previous and result[metric] > previous[metric] * threshold:
+				regressions.append((case_key(result), metric, previous[metric], result[metric]))
+	return regressions
+
+def git_revision() -> str:
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=basedir, capture_output=True, text=True).stdout.strip()
+	except OSError:
+		return ''
+
+def main(argv: list = None) -> int:
+	arg_parser = argparse.ArgumentParser(description='Benchmark MessageParser on synthetic messages generated from the dictionaries')
+	arg_parser.add_argument('-o', '--output', default='bench_output.json', help='file to write the results to')
+	arg_parser.add_argument('--versions', nargs='+', default=list(VERSIONS), choices=list(VERSIONS))
+	arg_parser.add_argument('--engines', nargs='+', default=[ENGINE_NATIVE, ENGINE_QUICKFIX] if has_quickfix() else [ENGINE_NATIVE], choices=[ENGINE_NATIVE, ENGINE_QUICKFIX])
+	arg_parser.add_argument('--msg-types', type=int, default=2, help='extra message types per version, picked by group nesting')
+	arg_parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per timing repeat')
+	arg_parser.add_argument('--repeat', type=int, default=5)
+	arg_parser.add_argument('--compare', help='previous results file to check for regressions')
+	arg_parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as a regression')
+	args = arg_parser.parse_args(argv)
+
+	results = run_benchmarks(args.versions, args.engines, args.msg_types, args.min_time, args.repeat)
+	with open(args.output, 'w') as output_file:
+		json.dump({
+			'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'revision': git_revision(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'results': results,
+		}, output_file, indent=2)
+
+	if args.compare:
+		regressions = compare_results(results, args.compare, args.threshold)
+		for key, metric, previous, current in regressions:
+			print(f'REGRESSION {key} {metric}: {previous:.1f} us -> {current:.1f} us', file=sys.stderr)
+		return 1 if regressions else 0
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
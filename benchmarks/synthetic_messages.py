@@ -0,0 +1,92 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fix_dictionary import FixDictionary, FieldLayout, APPL_VER_IDS
+
+# Header fields that are written explicitly and never generated from the layout
+STANDARD_HEADER = (8, 9, 35, 49, 56, 34, 52)
+TIMESTAMP = '20240102-13:14:15.678'
+
+def checksum(msg: str) -> str:
+	return f"{sum(msg.encode('latin-1')) % 256:03d}"
+
+class MessageGenerator():
+	# Builds valid tag=value messages from a dictionary, with configurable body size and repeating group depth/width
+	def __init__(self, fix_dict: FixDictionary, transport_dict: FixDictionary = None, seed: int = 0) -> None:
+		self.fix_dict = fix_dict
+		self.transport_dict = transport_dict if transport_dict else fix_dict
+		self.random = random.Random(seed)
+		appl_versions = {version: appl_ver_id for appl_ver_id, version in APPL_VER_IDS.items()}
+		version = f'{fix_dict.fix_type}{fix_dict.major}{fix_dict.minor}' + (f'SP{fix_dict.servicepack}' if fix_dict.servicepack not in ('', '0') else '')
+		self.appl_ver_id = appl_versions.get(version) if self.transport_dict is not fix_dict else None
+
+	def field_value(self, tag: int, index: int = 0) -> str:
+		enums = self.fix_dict.field_enums.get(tag)
+		if enums:
+			return self.random.choice(list(enums.keys()))
+		field_type = self.fix_dict.field_types.get(tag, 'STRING')
+		if field_type in ('INT', 'SEQNUM', 'NUMINGROUP', 'LENGTH', 'DAYOFMONTH'):
+			return str(self.random.randint(1, 9999))
+		if field_type in ('PRICE', 'QTY', 'AMT', 'FLOAT', 'PRICEOFFSET', 'PERCENTAGE'):
+			return f'{self.random.uniform(1, 10000):.4f}'
+		if field_type in ('UTCTIMESTAMP', 'TZTIMESTAMP'):
+			return TIMESTAMP
+		if field_type in ('LOCALMKTDATE', 'UTCDATEONLY', 'UTCDATE'):
+			return TIMESTAMP[:8]
+		if field_type == 'MONTHYEAR':
+			return TIMESTAMP[:6]
+		if field_type == 'BOOLEAN':
+			return self.random.choice('YN')
+		if field_type == 'CHAR':
+			return 'A'
+		if field_type == 'CURRENCY':
+			return 'USD'
+		return f'V{tag}x{index}'
+
+	def layout_fields(self, layout: FieldLayout, field_count: int, group_depth: int, group_width: int, skip: tuple = ()) -> list:
+		# Required fields first, then optional ones in layout order, until field_count plain fields are used
+		data_tags = self.fix_dict.data_tags | self.fix_dict.length_tags
+		plain_tags = [tag for tag in layout.tags if tag not in layout.groups and tag not in data_tags and tag not in skip]
+		chosen = [tag for tag in plain_tags if tag in layout.required]
+		chosen += [tag for tag in plain_tags if tag not in layout.required][:max(0, field_count - len(chosen))]
+		chosen = set(chosen)
+		if layout.delim in plain_tags:
+			chosen.add(layout.delim)
+		fields = []
+		for tag in layout.tags:
+			if tag in layout.groups:
+				if group_depth > 0:
+					fields.extend(self.group_fields(layout.groups[tag], field_count, group_depth - 1, group_width))
+			elif tag in chosen:
+				fields.append((tag, self.field_value(tag, len(fields))))
+		return fields
+
+	def group_fields(self, layout: FieldLayout, field_count: int, group_depth: int, group_width: int) -> list:
+		entries = []
+		for _ in range(group_width):
+			entry = self.layout_fields(layout, max(1, field_count // 4), group_depth, group_width)
+			if not entry or entry[0][0] != layout.delim:
+				# A group whose delimiter is itself a group or data field cannot be generated
+				return []
+			entries.extend(entry)
+		return [(layout.count_tag, str(group_width))] + entries if entries else []
+
+	def generate(self, msg_type: str, field_count: int = 20, group_depth: int = 1, group_width: int = 2, seq_num: int = 1) -> str:
+		layout = self.fix_dict.messages[msg_type]
+		body_fields = [(35, msg_type), (49, 'SENDER'), (56, 'TARGET'), (34, str(seq_num)), (52, TIMESTAMP)]
+		if self.appl_ver_id:
+			body_fields.append((1128, self.appl_ver_id))
+		body_fields += self.layout_fields(layout, field_count, group_depth, group_width, STANDARD_HEADER)
+		body = ''.join(f'{tag}={value}\x01' for tag, value in body_fields)
+		msg = f'8={self.transport_dict.begin_string}\x019={len(body)}\x01{body}'
+		return f'{msg}10={checksum(msg)}\x01'
+
+def deepest_message_types(fix_dict: FixDictionary, count: int = 3) -> list:
+	# Message types with the most deeply nested repeating groups make the heaviest benchmark cases
+	def depth(layout: FieldLayout) -> int:
+		return 1 + max((depth(group) for group in layout.groups.values()), default=0) if layout.groups else 0
+	ranked = sorted(fix_dict.messages.items(), key=lambda item: (depth(item[1]), len(item[1].tags)), reverse=True)
+	return [msg_type for msg_type, _ in ranked[:count]]
@@ -0,0 +1,137 @@
+import xml.etree.ElementTree as ET
+from array import array
+from fix_dictionary import FixDictionary, DictionarySet
+
+SECTIONS = ('header', 'body', 'trailer')
+HEADER, BODY, TRAILER = range(3)
+
+class CompactMessage():
+	# Parsed message kept as the original text plus parallel arrays, one slot per field:
+	#   tags      tag number
+	#   starts    offset of the value in buffer, the value ends at stops
+	#   sections  HEADER, BODY or TRAILER
+	#   parents   index of the NumInGroup field owning the group entry the field is in, -1 at the top level
+	#   entries   number of that group entry
+	#   spans     index just past the field's last nested field, so subtrees are contiguous ranges
+	# Names and enums are looked up from the dictionaries only when asked for.
+	__slots__ = ('buffer', 'delim', 'tags', 'starts', 'stops', 'sections', 'parents', 'entries', 'spans', 'dictionary_set', 'body_dict')
+
+	def __init__(self, buffer: str, delim: str, dictionary_set: DictionarySet, body_dict: FixDictionary) -> None:
+		self.buffer = buffer
+		self.delim = delim
+		self.tags = array('i')
+		self.starts = array('i')
+		self.stops = array('i')
+		self.sections = array('b')
+		self.parents = array('i')
+		self.entries = array('i')
+		self.spans = array('i')
+		self.dictionary_set = dictionary_set
+		self.body_dict = body_dict
+
+	def __len__(self) -> int:
+		return len(self.tags)
+
+	def nbytes(self) -> int:
+		# Memory held by the arrays and the text, without the shared dictionaries
+		arrays = (self.tags, self.starts, self.stops, self.sections, self.parents, self.entries, self.spans)
+		return sum(values.itemsize * len(values) for values in arrays) + len(self.buffer)
+
+	def tag(self, index: int) -> int:
+		return self.tags[index]
+
+	def value(self, index: int) -> str:
+		return self.buffer[self.starts[index]:self.stops[index]]
+
+	def section(self, index: int) -> str:
+		return SECTIONS[self.sections[index]]
+
+	def field_dict(self, index: int) -> FixDictionary:
+		return self.body_dict if self.sections[index] == BODY else self.dictionary_set.transport
+
+	def name(self, index: int) -> str:
+		return self.dictionary_set.field_name(self.tags[index], self.field_dict(index))
+
+	def enum(self, index: int) -> str:
+		return self.dictionary_set.enum_name(self.tags[index], self.value(index), self.field_dict(index))
+
+	def find(self, tag: int, section: int = None) -> int:
+		# Index of the first top level field with the tag, or -1
+		tags, parents, sections = self.tags, self.parents, self.sections
+		for index in range(len(tags)):
+			if tags[index] == tag and parents[index] < 0 and (section is None or sections[index] == section):
+				return index
+		return -1
+
+	def find_value(self, tag: int, section: int = None) -> str:
+		index = self.find(tag, section)
+		return self.value(index) if index >= 0 else None
+
+	def field_path(self, index: int) -> str:
+		# Same paths as MessageParser.iter_tree_fields, e.g. 453[1].802[0].523
+		path = str(self.tags[index])
+		parent = self.parents[index]
+		while parent >= 0:
+			path = f'{self.tags[parent]}[{self.entries[index]}].{path}'
+			index = parent
+			parent = self.parents[index]
+		return path
+
+	def section_fields(self, section: int) -> list:
+		# Top level fields of a section, in message order
+		fields = []
+		index = 0
+		count = len(self.tags)
+		while index < count:
+			if self.sections[index] == section:
+				fields.append(index)
+			index = self.spans[index]
+		return fields
+
+	def group_entries(self, index: int) -> list:
+		# Field indices of each entry of the group counted by the field at index
+		groups = []
+		child = index + 1
+		stop = self.spans[index]
+		while child < stop:
+			entry = self.entries[child]
+			while len(groups) <= entry:
+				groups.append([])
+			groups[entry].append(child)
+			child = self.spans[child]
+		return groups
+
+	def iter_fields(self):
+		# Yields (section, path, index) for every field, with the same paths as MessageParser.iter_tree_fields
+		for section in range(len(SECTIONS)):
+			yield from self.iter_group_fields(SECTIONS[section], '', self.section_fields(section))
+
+	def iter_group_fields(self, section: str, prefix: str, fields: list):
+		for index in fields:
+			path = f'{prefix}{self.tags[index]}'
+			yield section, path, index
+			for entry, children in enumerate(self.group_entries(index)):
+				yield from self.iter_group_fields(section, f'{path}[{entry}].', children)
+
+	def to_tree(self) -> ET.Element:
+		# Same element layout as MessageParser.parse_msg_native, for code that still works on trees
+		message_elem = ET.Element('message')
+		for section in range(len(SECTIONS)):
+			self.add_field_elems(ET.SubElement(message_elem, SECTIONS[section]), self.section_fields(section))
+		return message_elem
+
+	def add_field_elems(self, parent: ET.Element, fields: list):
+		for index in fields:
+			field_elem = ET.SubElement(parent, 'field')
+			name = self.name(index)
+			if name:
+				field_elem.set('name', name)
+			field_elem.set('number', str(self.tags[index]))
+			value = self.value(index)
+			field_elem.set('raw', value)
+			enum = self.enum(index)
+			if enum:
+				field_elem.set('enum', enum)
+			field_elem.text = value
+			for children in self.group_entries(index):
+				self.add_field_elems(ET.SubElement(field_elem, 'group'), children)
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+# Rough cost of one decoded field (element, attribute dict and strings), used to bound the cache by memory
+FIELD_OVERHEAD_BYTES = 600
+
+def estimate_size(msg: str, delim: str) -> int:
+	return len(msg) + (msg.count(delim) + 1) * FIELD_OVERHEAD_BYTES
+
+class DecodeCache():
+	# LRU of parsed messages bounded by entry count and approximate bytes, either limit can be 0 for unbounded
+	def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024) -> None:
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.total_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.lock = threading.Lock()
+
+	def get(self, key: tuple):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key: tuple, value, size: int):
+		with self.lock:
+			if self.max_bytes and size > self.max_bytes:
+				return
+			previous = self.entries.pop(key, None)
+			if previous is not None:
+				self.total_bytes -= previous[1]
+			self.entries[key] = (value, size)
+			self.total_bytes += size
+			while self.entries and ((self.max_entries and len(self.entries) > self.max_entries) or (self.max_bytes and self.total_bytes > self.max_bytes)):
+				_, (_, evicted_size) = self.entries.popitem(last=False)
+				self.total_bytes -= evicted_size
+				self.evictions += 1
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.total_bytes = 0
+
+	def stats(self) -> dict:
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {
+				'entries': len(self.entries),
+				'bytes': self.total_bytes,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+				'hit_rate': self.hits / lookups if lookups else 0.0,
+			}
@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import socket
+import signal
+import asyncio
+import getpass
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from message_parser import MessageParser, ENGINE_NATIVE
+from fix_stream import detect_delimiter
+from message_validator import issue_path
+
+# Protocol: one JSON object per line in each direction.
+#   request   {"id": 1, "messages": ["8=FIX.4.4|9=...", ...], "delim": "|", "validate": false}
+#   response  {"id": 1, "results": [{"header": [...], "body": [...], "trailer": [...]}, {"error": "..."}, ...]}
+# delim is optional and detected per message when missing. A connection may send any number of requests
+# without waiting, the responses come back in request order.
+
+DEFAULT_PORT = 8765
+# Largest request line accepted, a batch of a few thousand messages stays well below it
+MAX_LINE = 64 << 20
+
+def default_address() -> str:
+	if hasattr(socket, 'AF_UNIX'):
+		return 'unix:' + os.path.join(tempfile.gettempdir(), f'fixv-decode-{getpass.getuser()}.sock')
+	return f'127.0.0.1:{DEFAULT_PORT}'
+
+def parse_address(address: str) -> tuple:
+	# 'unix:/path/to.sock' or 'host:port', returns ('unix', path) or ('tcp', host, port)
+	if address.startswith('unix:'):
+		return 'unix', address[5:]
+	host, _, port = address.rpartition(':')
+	try:
+		return 'tcp', host if host else '127.0.0.1', int(port)
+	except ValueError:
+		raise ValueError(f'Invalid decode server address: {address}') from None
+
+class DecodeServer():
+	# Serves decodes from one warm MessageParser to any number of local clients. Decoding runs on a single
+	# worker thread, so the parser is never used concurrently and the event loop keeps accepting connections.
+	def __init__(self, msg_parser: MessageParser, address: str = None) -> None:
+		self.msg_parser = msg_parser
+		self.address = address if address else default_address()
+		self.executor = ThreadPoolExecutor(1, thread_name_prefix='fixv-decode')
+		self.loop = None
+		self.server = None
+		self.thread = None
+		self.request_count = 0
+
+	def decode_request(self, line: bytes) -> bytes:
+		# Never raises, a malformed request gets an error response and the connection stays open
+		request_id = None
+		try:
+			request = json.loads(line)
+			if not isinstance(request, dict):
+				raise TypeError('request must be a JSON object')
+			request_id = request.get('id')
+			messages = request['messages']
+			if not isinstance(messages, list) or not all(isinstance(msg, str) for msg in messages):
+				raise TypeError('messages must be a list of strings')
+			delim = request.get('delim')
+			if delim is not None and not isinstance(delim, str):
+				raise TypeError('delim must be a string')
+			validate = bool(request.get('validate')) and self.msg_parser.engine == ENGINE_NATIVE
+			results = [self.decode_message(msg, delim if delim else detect_delimiter(msg), validate) for msg in messages]
+			response = {'id': request_id, 'results': results}
+		except (ValueError, KeyError, TypeError) as error:
+			response = {'id': request_id, 'error': f'[{type(error).__name__}Error] Invalid request: {error}'}
+		except Exception as error:
+			response = {'id': request_id, 'error': f'[{type(error).__name__}Error] {error}'}
+		self.request_count += 1
+		return json.dumps(response).encode() + b'\n'
+
+	def decode_message(self, msg: str, delim: str, validate: bool) -> dict:
+		try:
+			if validate:
+				message, issues = self.msg_parser.validate_msg(msg, delim)
+				result = MessageParser.tree_to_dict(message.to_tree())
+				result['validation'] = [{'path': issue_path(message, issue), 'problem': issue.text} for issue in issues]
+				return result
+			return MessageParser.tree_to_dict(self.msg_parser.parse_msg(msg, delim))
+		except Exception as error:
+			return {'error': f'[{type(error).__name__}Error] {error}'}
+
+	async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		# Requests keep being read while earlier responses are written, a client that sends a window of
+		# batches before reading can never block on a server that is blocked writing to it
+		loop = asyncio.get_running_loop()
+		responses = asyncio.Queue()
+
+		async def write_responses():
+			while True:
+				response = await responses.get()
+				if response is None:
+					return
+				writer.write(await response)
+				await writer.drain()
+
+		writer_task = asyncio.create_task(write_responses())
+		try:
+			while not writer_task.done():
+				line = await reader.readline()
+				if not line:
+					break
+				if line.strip():
+					# The single executor thread decodes in submission order
+					responses.put_nowait(loop.run_in_executor(self.executor, self.decode_request, line))
+			responses.put_nowait(None)
+			await writer_task
+		except (ConnectionError, asyncio.LimitOverrunError, ValueError, asyncio.CancelledError):
+			# Client went away, sent an oversized line or the server is shutting down, only this connection is dropped
+			pass
+		finally:
+			writer_task.cancel()
+			# Decodes still queued for this connection are not started
+			while not responses.empty():
+				response = responses.get_nowait()
+				if response is not None:
+					response.cancel()
+			writer.close()
+
+	async def start(self):
+		kind, *target = parse_address(self.address)
+		if kind == 'unix':
+			path = target[0]
+			if os.path.exists(path):
+				if is_listening(self.address):
+					raise OSError(f'A decode server is already listening on {path}')
+				# Left behind by a server that did not shut down cleanly
+				os.unlink(path)
+			self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=MAX_LINE)
+			os.chmod(path, 0o600)
+		else:
+			host, port = target
+			self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+
+	async def serve(self):
+		await self.start()
+		async with self.server:
+			await self.server.serve_forever()
+
+	def run(self):
+		try:
+			asyncio.run(self.serve())
+		finally:
+			self.cleanup()
+
+	def start_in_thread(self):
+		# Hosts the server next to a GUI, start errors such as an address in use are raised here
+		started = threading.Event()
+		errors = []
+		def run_thread():
+			self.loop = asyncio.new_event_loop()
+			try:
+				self.loop.run_until_complete(self.start())
+			except OSError as error:
+				errors.append(error)
+				started.set()
+				self.loop.close()
+				return
+			started.set()
+			try:
+				self.loop.run_forever()
+			finally:
+				self.server.close()
+				self.loop.run_until_complete(self.server.wait_closed())
+				self.cleanup()
+				self.loop.close()
+		self.thread = threading.Thread(target=run_thread, name='fixv-decode-server', daemon=True)
+		self.thread.start()
+		started.wait()
+		if errors:
+			self.thread = None
+			raise errors[0]
+
+	def stop(self):
+		if self.thread is None:
+			return
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+		self.thread = None
+
+	def cleanup(self):
+		kind, *target = parse_address(self.address)
+		if kind == 'unix' and os.path.exists(target[0]):
+			os.unlink(target[0])
+		self.executor.shutdown(wait=False)
+
+def open_connection(address: str, timeout: float = None) -> socket.socket:
+	kind, *target = parse_address(address)
+	if kind == 'unix':
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(timeout)
+		try:
+			sock.connect(target[0])
+		except OSError:
+			sock.close()
+			raise
+		return sock
+	return socket.create_connection(tuple(target), timeout)
+
+def is_listening(address: str) -> bool:
+	try:
+		open_connection(address, 1).close()
+		return True
+	except OSError:
+		return False
+
+class DecodeClient():
+	# Blocking client for scripts, one connection is opened on first use and kept for every later request
+	def __init__(self, address: str = None, timeout: float = 60) -> None:
+		self.address = address if address else default_address()
+		self.timeout = timeout
+		self.sock = None
+		self.reader = None
+		self.next_id = 0
+
+	def __enter__(self) -> 'DecodeClient':
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def connect(self):
+		if self.sock is None:
+			self.sock = open_connection(self.address, self.timeout)
+			self.reader = self.sock.makefile('rb')
+
+	def close(self):
+		if self.sock is not None:
+			self.reader.close()
+			self.sock.close()
+			self.sock = None
+			self.reader = None
+
+	def send(self, messages: list, delim: str = None, validate: bool = False) -> int:
+		self.next_id += 1
+		request = {'id': self.next_id, 'messages': list(messages), 'validate': validate}
+		if delim:
+			request['delim'] = delim
+		self.sock.sendall(json.dumps(request).encode() + b'\n')
+		return self.next_id
+
+	def receive(self) -> list:
+		line = self.reader.readline()
+		if not line:
+			self.close()
+			raise ConnectionError('Decode server closed the connection')
+		response = json.loads(line)
+		if 'error' in response:
+			raise ValueError(response['error'])
+		return response['results']
+
+	def decode(self, messages: list, delim: str = None, validate: bool = False) -> list:
+		# One result per message, the parsed sections or {'error': ...}
+		self.connect()
+		self.send(messages, delim, validate)
+		return self.receive()
+
+	def decode_batches(self, batches, delim: str = None, validate: bool = False, window: int = 8):
+		# Pipelines up to window batches ahead of the responses, yields the results of each batch in order
+		self.connect()
+		pending = deque()
+		for batch in batches:
+			pending.append(self.send(batch, delim, validate))
+			if len(pending) >= window:
+				pending.popleft()
+				yield self.receive()
+		while pending:
+			pending.popleft()
+			yield self.receive()
+
+def main(argv: list = None) -> int:
+	# Imported here so hosting the server from the viewer does not pull in the command line module
+	from fixv_cli import read_parser_config, build_parser, basedir
+
+	arg_parser = argparse.ArgumentParser(description='Keep FIX dictionaries loaded and decode messages for local clients')
+	arg_parser.add_argument('-a', '--address', default=default_address(), help="'unix:/path/to.sock' or 'host:port', localhost only is recommended")
+	arg_parser.add_argument('-c', '--config', default=os.path.join(basedir, 'app_config.ini'), help='config file with the dictionary options')
+	arg_parser.add_argument('--data-dict', help='data or transport dictionary, overrides the config')
+	arg_parser.add_argument('--app-dict', help='application dictionary, overrides the config')
+	args = arg_parser.parse_args(argv)
+
+	options = read_parser_config(args.config)
+	if args.data_dict:
+		options['data_dict_path'] = args.data_dict
+		options['app_dict_path'] = args.app_dict
+	if not options.get('data_dict_path'):
+		print('No dictionary configured, use --data-dict or --config', file=sys.stderr)
+		return 2
+	msg_parser = build_parser(options)
+	paths = msg_parser.preload_dictionaries()
+	server = DecodeServer(msg_parser, args.address)
+	print(f'Decoding on {server.address} with {len(paths) if paths else 1} dictionaries loaded', file=sys.stderr)
+	# Terminating the process closes the server the same way as Ctrl+C, so the socket file is removed
+	signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+	try:
+		server.run()
+	except KeyboardInterrupt:
+		pass
+	except OSError as error:
+		print(f'Decode server could not start: {error}', file=sys.stderr)
+		return 2
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,80 @@
+import threading
+from PyQt6 import QtCore
+from message_parser import MessageParser, ENGINE_NATIVE
+
+class DecodeWorker(QtCore.QObject):
+	# Decodes on its own thread and only ever works on the latest request, older pending ones are dropped
+	# (request id, tree, error, stage timings, validation issues or None)
+	finished = QtCore.pyqtSignal(int, object, object, object, object)
+	# (request id, list of DecodedMessage) for a batch request
+	batch_finished = QtCore.pyqtSignal(int, object)
+	requested = QtCore.pyqtSignal()
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.lock = threading.Lock()
+		self.pending = None
+		self.latest_request_id = 0
+		self.requested.connect(self.process)
+
+	def submit(self, request_id: int, msg_parser: MessageParser, msg: str, delim: str, validate: bool = False):
+		# Called from the GUI thread, the queued signal wakes the worker thread up
+		with self.lock:
+			self.pending = (request_id, msg_parser, msg, delim, validate)
+			self.latest_request_id = request_id
+		self.requested.emit()
+
+	def submit_batch(self, request_id: int, msg_parser: MessageParser, messages: list):
+		# messages are strings or RawMessage, decoded in one go with the same parser
+		self.submit(request_id, msg_parser, messages, None)
+
+	def is_stale(self, request_id: int) -> bool:
+		return request_id != self.latest_request_id
+
+	@QtCore.pyqtSlot()
+	def process(self):
+		with self.lock:
+			request = self.pending
+			self.pending = None
+		if request is None:
+			return
+		request_id, msg_parser, msg, delim, validate = request
+		if isinstance(msg, list):
+			self.process_batch(request_id, msg_parser, msg)
+			return
+		issues = None
+		try:
+			if validate:
+				msg_tree, issues = msg_parser.validate_msg(msg, delim)
+			else:
+				msg_tree = msg_parser.parse_msg(msg, delim)
+			error = None
+		except Exception as parse_error:
+			msg_tree = None
+			error = parse_error
+		# A newer request arrived while decoding, nobody is waiting for this result anymore
+		if self.is_stale(request_id):
+			return
+		timings = msg_parser.stage_timer.last_sample() if msg_parser.stage_timer else None
+		self.finished.emit(request_id, msg_tree, error, timings, issues)
+
+	def process_batch(self, request_id: int, msg_parser: MessageParser, messages: list):
+		# Batches only feed the message list, so the native engine keeps them compact and trees are built per selection
+		compact = msg_parser.engine == ENGINE_NATIVE
+		decoded = []
+		for message in msg_parser.parse_many(messages, compact=compact):
+			decoded.append(message)
+			if self.is_stale(request_id):
+				return
+		self.batch_finished.emit(request_id, decoded)
+
+class DecodeThread():
+	def __init__(self, parent: QtCore.QObject = None) -> None:
+		self.thread = QtCore.QThread(parent)
+		self.worker = DecodeWorker()
+		self.worker.moveToThread(self.thread)
+		self.thread.start()
+
+	def stop(self):
+		self.thread.quit()
+		self.thread.wait()
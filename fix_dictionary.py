@@ -0,0 +1,370 @@
+import os
+import re
+import sys
+import glob
+import pickle
+import hashlib
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+
+# Bump whenever FixDictionary or FieldLayout change shape so stale snapshots are rebuilt
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.fixvd'
+
+# ApplVerID (1128) enum values and the dictionary version they select
+APPL_VER_IDS = {
+	'2': 'FIX40',
+	'3': 'FIX41',
+	'4': 'FIX42',
+	'5': 'FIX43',
+	'6': 'FIX44',
+	'7': 'FIX50',
+	'8': 'FIX50SP1',
+	'9': 'FIX50SP2',
+}
+
+# Tags that quickfix always treats as part of the standard header/trailer
+HEADER_TAGS = (8, 9, 35)
+TRAILER_TAGS = (93, 89, 10)
+
+class FieldLayout():
+	# Ordered member layout of a header, trailer, message or repeating group
+	__slots__ = ('name', 'count_tag', 'delim', 'tags', 'members', 'required', 'groups')
+
+	def __init__(self, name: str, count_tag: int = 0) -> None:
+		self.name = name
+		self.count_tag = count_tag
+		self.delim = 0
+		self.tags = []
+		self.members = set()
+		self.required = set()
+		self.groups = {}
+
+	def add_field(self, tag: int, required: bool = False):
+		if not self.tags:
+			self.delim = tag
+		self.tags.append(tag)
+		self.members.add(tag)
+		if required:
+			self.required.add(tag)
+
+	def add_group(self, group: 'FieldLayout', required: bool = False):
+		self.add_field(group.count_tag, required)
+		self.groups[group.count_tag] = group
+
+class FixDictionary():
+	# Number of times any dictionary file has been read and parsed in this process
+	load_count = 0
+
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.field_names = {}
+		self.field_numbers = {}
+		self.field_types = {}
+		self.field_enums = {}
+		self.length_tags = set()
+		self.data_tags = set()
+		self.header = FieldLayout('header')
+		self.trailer = FieldLayout('trailer')
+		self.messages = {}
+		self.message_names = {}
+		self.load(path)
+
+	def load(self, path: str):
+		root = ET.parse(path).getroot()
+		FixDictionary.load_count += 1
+		self.fix_type = root.get('type', 'FIX')
+		self.major = root.get('major', '')
+		self.minor = root.get('minor', '')
+		self.servicepack = root.get('servicepack', '0')
+		self.begin_string = f'{self.fix_type}.{self.major}.{self.minor}'
+
+		fields_elem = root.find('fields')
+		for field_elem in (fields_elem if fields_elem is not None else []):
+			tag = int(field_elem.get('number'))
+			name = field_elem.get('name')
+			field_type = field_elem.get('type', 'STRING')
+			self.field_names[tag] = name
+			self.field_numbers[name] = tag
+			self.field_types[tag] = field_type
+			if field_type == 'LENGTH':
+				self.length_tags.add(tag)
+			elif field_type in ('DATA', 'XMLDATA'):
+				self.data_tags.add(tag)
+			enums = {value_elem.get('enum'): value_elem.get('description') for value_elem in field_elem.iterfind('value')}
+			if enums:
+				self.field_enums[tag] = enums
+
+		components = {}
+		components_elem = root.find('components')
+		for component_elem in (components_elem if components_elem is not None else []):
+			components[component_elem.get('name')] = component_elem
+
+		for section, layout in (('header', self.header), ('trailer', self.trailer)):
+			section_elem = root.find(section)
+			if section_elem is not None:
+				self.build_layout(section_elem, layout, components)
+
+		messages_elem = root.find('messages')
+		for message_elem in (messages_elem if messages_elem is not None else []):
+			msg_type = message_elem.get('msgtype')
+			layout = FieldLayout(message_elem.get('name'))
+			self.build_layout(message_elem, layout, components)
+			self.messages[msg_type] = layout
+			self.message_names[msg_type] = layout.name
+
+	def build_layout(self, parent_elem: ET.Element, layout: FieldLayout, components: dict, required: bool = True):
+		for elem in parent_elem:
+			is_required = required and elem.get('required', 'N') == 'Y'
+			if elem.tag == 'field':
+				tag = self.field_numbers.get(elem.get('name'))
+				if tag is not None:
+					layout.add_field(tag, is_required)
+			elif elem.tag == 'group':
+				tag = self.field_numbers.get(elem.get('name'))
+				if tag is None:
+					continue
+				group = FieldLayout(elem.get('name'), tag)
+				self.build_layout(elem, group, components)
+				layout.add_group(group, is_required)
+			elif elem.tag == 'component':
+				component_elem = components.get(elem.get('name'))
+				if component_elem is not None:
+					# Component members are only required when the component itself is
+					self.build_layout(component_elem, layout, components, is_required)
+
+	def field_name(self, tag: int) -> str:
+		return self.field_names.get(tag)
+
+	def enum_name(self, tag: int, value: str) -> str:
+		enums = self.field_enums.get(tag)
+		return enums.get(value) if enums else None
+
+	def is_header_field(self, tag: int) -> bool:
+		return tag in self.header.members or tag in HEADER_TAGS
+
+	def is_trailer_field(self, tag: int) -> bool:
+		return tag in self.trailer.members or tag in TRAILER_TAGS
+
+def file_digest(path: str) -> str:
+	with open(path, 'rb') as dict_file:
+		return hashlib.sha256(dict_file.read()).hexdigest()
+
+def cache_file_path(cache_dir: str, path: str) -> str:
+	# Local snapshots are keyed by the absolute path so dictionaries with the same file name do not collide
+	stem = os.path.splitext(os.path.basename(path))[0]
+	path_key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+	return os.path.join(cache_dir, f'{stem}-{path_key}{CACHE_SUFFIX}')
+
+def prebuilt_cache_file_path(cache_dir: str, path: str) -> str:
+	# Prebuilt snapshots are built on another machine, so they are matched by file name and content hash only
+	stem = os.path.splitext(os.path.basename(path))[0]
+	return os.path.join(cache_dir, f'{stem}{CACHE_SUFFIX}')
+
+def read_snapshot_header(cache_file: str) -> dict:
+	try:
+		with open(cache_file, 'rb') as snapshot:
+			header = pickle.load(snapshot)
+	except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+		return None
+	if not isinstance(header, dict) or header.get('version') != CACHE_VERSION:
+		return None
+	return header
+
+def read_snapshot(cache_file: str, path: str) -> FixDictionary:
+	with open(cache_file, 'rb') as snapshot:
+		pickle.load(snapshot)
+		fix_dict = pickle.load(snapshot)
+	fix_dict.path = path
+	return fix_dict
+
+def write_snapshot(cache_file: str, fix_dict: FixDictionary, path: str, digest: str):
+	stat = os.stat(path)
+	header = {
+		'version': CACHE_VERSION,
+		'path': os.path.abspath(path),
+		'mtime_ns': stat.st_mtime_ns,
+		'size': stat.st_size,
+		'digest': digest,
+	}
+	os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+	temp_file = f'{cache_file}.{os.getpid()}.tmp'
+	try:
+		with open(temp_file, 'wb') as snapshot:
+			pickle.dump(header, snapshot, pickle.HIGHEST_PROTOCOL)
+			pickle.dump(fix_dict, snapshot, pickle.HIGHEST_PROTOCOL)
+		os.replace(temp_file, cache_file)
+	finally:
+		if os.path.exists(temp_file):
+			os.remove(temp_file)
+
+def save_snapshot(cache_file: str, fix_dict: FixDictionary, path: str, digest: str):
+	try:
+		write_snapshot(cache_file, fix_dict, path, digest)
+	except OSError as error:
+		# A read-only install location should not stop the dictionary from being used
+		print(f'Could not write dictionary cache {cache_file}: {error}')
+
+def load_cached_dictionary(path: str, cache_dir: str = None, prebuilt_cache_dir: str = None) -> FixDictionary:
+	stat = os.stat(path)
+	digest = None
+	cache_file = cache_file_path(cache_dir, path) if cache_dir else None
+
+	if cache_file:
+		header = read_snapshot_header(cache_file)
+		if header and header['path'] == os.path.abspath(path) and header['size'] == stat.st_size:
+			if header['mtime_ns'] == stat.st_mtime_ns:
+				return read_snapshot(cache_file, path)
+			# Touched but possibly unchanged, fall back to comparing the content hash
+			digest = file_digest(path)
+			if header['digest'] == digest:
+				fix_dict = read_snapshot(cache_file, path)
+				save_snapshot(cache_file, fix_dict, path, digest)
+				return fix_dict
+
+	fix_dict = None
+	if prebuilt_cache_dir:
+		prebuilt_file = prebuilt_cache_file_path(prebuilt_cache_dir, path)
+		header = read_snapshot_header(prebuilt_file)
+		if header:
+			digest = digest if digest else file_digest(path)
+			if header['digest'] == digest:
+				fix_dict = read_snapshot(prebuilt_file, path)
+
+	if fix_dict is None:
+		fix_dict = FixDictionary(path)
+	if cache_file:
+		save_snapshot(cache_file, fix_dict, path, digest if digest else file_digest(path))
+	return fix_dict
+
+class DictionarySet():
+	# Transport and application dictionaries that together describe one message
+	def __init__(self, transport: FixDictionary, app: FixDictionary = None) -> None:
+		self.transport = transport if transport else app
+		self.app = app if app else transport
+		self.length_tags = self.transport.length_tags | self.app.length_tags
+		self.data_tags = self.transport.data_tags | self.app.data_tags
+
+	def message_layout(self, msg_type: str) -> tuple:
+		layout = self.app.messages.get(msg_type)
+		if layout is None and self.transport is not self.app:
+			# Session level messages of FIXT are only defined in the transport dictionary
+			layout = self.transport.messages.get(msg_type)
+			if layout is not None:
+				return layout, self.transport
+		return layout, self.app
+
+	def field_name(self, tag: int, fix_dict: FixDictionary) -> str:
+		name = fix_dict.field_names.get(tag)
+		if name is None:
+			other_dict = self.transport if fix_dict is self.app else self.app
+			name = other_dict.field_names.get(tag)
+		return name
+
+	def enum_name(self, tag: int, value: str, fix_dict: FixDictionary) -> str:
+		if tag not in fix_dict.field_names:
+			fix_dict = self.transport if fix_dict is self.app else self.app
+		return fix_dict.enum_name(tag, value)
+
+# Warm store shared by every parser in the process, keyed by absolute dictionary path
+_dictionary_store = {}
+_dictionary_store_lock = threading.Lock()
+
+def load_dictionary(path: str, cache_dir: str = None, prebuilt_cache_dir: str = None) -> FixDictionary:
+	key = os.path.abspath(path)
+	fix_dict = _dictionary_store.get(key)
+	if fix_dict is None:
+		with _dictionary_store_lock:
+			fix_dict = _dictionary_store.get(key)
+			if fix_dict is None:
+				if cache_dir or prebuilt_cache_dir:
+					fix_dict = load_cached_dictionary(path, cache_dir, prebuilt_cache_dir)
+				else:
+					fix_dict = FixDictionary(path)
+				_dictionary_store[key] = fix_dict
+	return fix_dict
+
+def loaded_dictionaries() -> list:
+	return list(_dictionary_store.keys())
+
+def read_version(path: str) -> str:
+	# Only the root element is needed to know the version, so avoid parsing the whole file
+	with open(path, 'rb') as dict_file:
+		head = dict_file.read(512).decode('utf-8', 'ignore')
+	root_match = re.search(r'<fix\s[^>]*>', head)
+	if root_match is None:
+		return None
+	attrs = dict(re.findall(r'(\w+)\s*=\s*[\'"]([^\'"]*)[\'"]', root_match.group(0)))
+	version = f"{attrs.get('type', 'FIX')}{attrs.get('major', '')}{attrs.get('minor', '')}"
+	if attrs.get('servicepack', '0') not in ('', '0'):
+		version += f"SP{attrs['servicepack']}"
+	return version
+
+class DictionaryRegistry():
+	# Maps BeginString (8) and ApplVerID (1128) to dictionary files, which are only loaded when first used
+	def __init__(self, dictionary_paths: list, default_appl_version: str = None, cache_dir: str = None, prebuilt_cache_dir: str = None) -> None:
+		self.cache_dir = cache_dir
+		self.prebuilt_cache_dir = prebuilt_cache_dir
+		self.version_paths = {}
+		for path in dictionary_paths:
+			version = read_version(path)
+			if version and version not in self.version_paths:
+				self.version_paths[version] = path
+		self.default_appl_version = default_appl_version if default_appl_version else self.latest_appl_version()
+		self.dictionary_sets = {}
+
+	@staticmethod
+	def from_directory(dictionary_dir: str, default_appl_version: str = None, cache_dir: str = None, prebuilt_cache_dir: str = None) -> 'DictionaryRegistry':
+		return DictionaryRegistry(sorted(glob.glob(os.path.join(dictionary_dir, '*.xml'))), default_appl_version, cache_dir, prebuilt_cache_dir)
+
+	def latest_appl_version(self) -> str:
+		fix5_versions = sorted(version for version in self.version_paths if version.startswith('FIX5'))
+		return fix5_versions[-1] if fix5_versions else None
+
+	def resolve_paths(self, begin_string: str, appl_ver_id: str = None) -> tuple:
+		# Returns (data or transport dictionary path, application dictionary path or None)
+		if not begin_string:
+			return None, None
+		version = begin_string.replace('.', '')
+		if version.startswith('FIXT'):
+			appl_version = APPL_VER_IDS.get(appl_ver_id, self.default_appl_version) if appl_ver_id else self.default_appl_version
+			return self.version_paths.get(version), self.version_paths.get(appl_version)
+		return self.version_paths.get(version), None
+
+	def preload(self) -> list:
+		# Loads every registered dictionary up front, for long running processes that should never pay for a load later
+		paths = sorted(self.version_paths.values())
+		for path in paths:
+			load_dictionary(path, self.cache_dir, self.prebuilt_cache_dir)
+		return paths
+
+	def dictionary_set(self, begin_string: str, appl_ver_id: str = None) -> DictionarySet:
+		paths = self.resolve_paths(begin_string, appl_ver_id)
+		if paths not in self.dictionary_sets:
+			transport_path, app_path = paths
+			if transport_path is None:
+				self.dictionary_sets[paths] = None
+			else:
+				transport = load_dictionary(transport_path, self.cache_dir, self.prebuilt_cache_dir)
+				app = load_dictionary(app_path, self.cache_dir, self.prebuilt_cache_dir) if app_path else None
+				self.dictionary_sets[paths] = DictionarySet(transport, app)
+		return self.dictionary_sets[paths]
+
+def build_prebuilt_cache(paths: list, cache_dir: str) -> list:
+	cache_files = []
+	for path in paths:
+		cache_file = prebuilt_cache_file_path(cache_dir, path)
+		write_snapshot(cache_file, FixDictionary(path), path, file_digest(path))
+		cache_files.append(cache_file)
+	return cache_files
+
+if __name__ == "__main__":
+	# Prebuild dictionary snapshots for packaged builds, e.g. python fix_dictionary.py dictionaries/*.xml -o dict_prebuilt
+	arg_parser = argparse.ArgumentParser(description='Build precompiled FIX dictionary snapshots')
+	arg_parser.add_argument('dictionaries', nargs='+', help='quickfix dictionary xml files')
+	arg_parser.add_argument('-o', '--output', default='dict_prebuilt', help='directory to write the snapshots to')
+	args = arg_parser.parse_args()
+	for cache_file in build_prebuilt_cache(args.dictionaries, args.output):
+		print(cache_file)
+	sys.exit(0)
@@ -0,0 +1,138 @@
+import mmap
+from collections import namedtuple
+from fix_stream import RawMessage, find_message
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# A message whose BodyLength (9) or CheckSum (10) does not match its bytes, expected is what the bytes give,
+# actual is what the message declares, None when the field is missing
+IntegrityProblem = namedtuple('IntegrityProblem', ['offset', 'field', 'expected', 'actual'])
+
+# Messages checked per vectorized pass, bounds the temporary arrays whatever the buffer size
+CHECK_BATCH = 10000
+
+def message_bounds(data, begin: int, stop: int, delim: bytes) -> tuple:
+	# (body start, trailer start, declared BodyLength, declared CheckSum), positions are -1 and values None when missing
+	body_start, declared_length = -1, None
+	first = data.find(delim, begin, stop)
+	if first >= 0 and data[first + len(delim):first + len(delim) + 2] == b'9=':
+		length_end = data.find(delim, first + len(delim) + 2, stop)
+		if length_end >= 0:
+			length_text = data[first + len(delim) + 2:length_end]
+			declared_length = int(length_text) if length_text.isdigit() else None
+			body_start = length_end + len(delim)
+	trailer, declared_checksum = data.rfind(delim + b'10=', begin, stop), None
+	if trailer >= 0:
+		trailer += len(delim)
+		checksum_text = data[trailer + 3:stop].rstrip(delim + b'\r\n')
+		declared_checksum = int(checksum_text) if checksum_text.isdigit() else None
+	return body_start, trailer, declared_length, declared_checksum
+
+def byte_sums(data, begins: list, trailers: list, delim: bytes) -> list:
+	# Sum of the bytes of each [begin, trailer) range, counted as if the delimiter were SOH
+	if np is None:
+		adjust = ord(delim) - 1 if len(delim) == 1 and delim != b'\x01' else 0
+		return [sum(data[begin:trailer]) - adjust * data.count(delim, begin, trailer) for begin, trailer in zip(begins, trailers)]
+	lo, hi = begins[0], trailers[-1] + 1
+	arr = np.frombuffer(data, dtype=np.uint8, count=hi - lo, offset=lo)
+	# Pairs of [begin, trailer) indices, reduceat sums each range and the gaps in between are dropped
+	indices = np.empty(2 * len(begins), dtype=np.int64)
+	indices[0::2] = begins
+	indices[1::2] = trailers
+	indices -= lo
+	sums = np.add.reduceat(arr, indices, dtype=np.uint64)[0::2]
+	if len(delim) == 1 and delim != b'\x01':
+		delim_counts = np.add.reduceat(arr == delim[0], indices, dtype=np.uint64)[0::2]
+		sums -= delim_counts * np.uint64(delim[0] - 1)
+	return sums.tolist()
+
+def check_frames(data, frames: list, base_offset: int = 0) -> list:
+	# frames are (begin, stop, delim) inside data, all with the same delimiter
+	problems = []
+	delim = frames[0][2] if frames else b'\x01'
+	checked = []
+	for begin, stop, frame_delim in frames:
+		body_start, trailer, declared_length, declared_checksum = message_bounds(data, begin, stop, frame_delim)
+		if trailer < 0:
+			problems.append(IntegrityProblem(base_offset + begin, 'CheckSum', None, None))
+			continue
+		if body_start < 0 or declared_length is None:
+			problems.append(IntegrityProblem(base_offset + begin, 'BodyLength', trailer - body_start if body_start >= 0 else None, None))
+		elif trailer - body_start != declared_length:
+			problems.append(IntegrityProblem(base_offset + begin, 'BodyLength', trailer - body_start, declared_length))
+		checked.append((begin, trailer, declared_checksum))
+	if checked:
+		begins, trailers, declared = zip(*checked)
+		for begin, checksum, declared_checksum in zip(begins, byte_sums(data, begins, trailers, delim), declared):
+			if checksum % 256 != declared_checksum:
+				problems.append(IntegrityProblem(base_offset + begin, 'CheckSum', checksum % 256, declared_checksum))
+	problems.sort(key=lambda problem: problem.offset)
+	return problems
+
+def check_buffer(data, base_offset: int = 0):
+	# Frames and checks every message in data, a batch of messages at a time
+	pos = 0
+	frames = []
+	while True:
+		found = find_message(data, pos)
+		if found is None or len(frames) >= CHECK_BATCH or (frames and found[2] != frames[0][2]):
+			if frames:
+				yield from check_frames(data, frames, base_offset)
+				frames = []
+			if found is None:
+				return
+		frames.append(found)
+		pos = found[1]
+
+def check_file(path: str):
+	with open(path, 'rb') as log_file:
+		try:
+			data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# Empty files cannot be mapped
+			return
+		try:
+			yield from check_buffer(data)
+		finally:
+			data.close()
+
+def check_messages(raw_messages: list) -> dict:
+	# Checks already framed messages, e.g. a decode batch, by joining them into one buffer.
+	# Returns {offset: [problem, ...]} keyed by the messages' own offsets.
+	if not raw_messages:
+		return {}
+	texts = [msg.text if isinstance(msg, RawMessage) else msg for msg in raw_messages]
+	data = '\n'.join(texts).encode('latin-1')
+	frames = []
+	offsets = {}
+	pos = 0
+	for index, text in enumerate(texts):
+		delim = raw_messages[index].delim if isinstance(raw_messages[index], RawMessage) else None
+		delim = delim.encode('latin-1') if delim else b'\x01'
+		frames.append((pos, pos + len(text), delim))
+		offsets[pos] = raw_messages[index].offset if isinstance(raw_messages[index], RawMessage) else index
+		pos += len(text) + 1
+	problems = {}
+	start = 0
+	while start < len(frames):
+		# Consecutive frames sharing a delimiter are checked together
+		stop = start + 1
+		while stop < len(frames) and frames[stop][2] == frames[start][2]:
+			stop += 1
+		for problem in check_frames(data, frames[start:stop]):
+			offset = offsets[problem.offset]
+			problems.setdefault(offset, []).append(problem._replace(offset=offset))
+		start = stop
+	return problems
+
+def describe_problem(problem: IntegrityProblem) -> str:
+	if problem.actual is None and problem.expected is None:
+		return f'{problem.field} missing'
+	if problem.actual is None:
+		return f'{problem.field} missing or invalid, expected {problem.expected}'
+	if problem.field == 'CheckSum':
+		return f'CheckSum {problem.actual:03d} does not match, expected {problem.expected:03d}'
+	return f'BodyLength {problem.actual} does not match, expected {problem.expected}'
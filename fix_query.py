@@ -0,0 +1,176 @@
+import re
+from fix_dictionary import FixDictionary
+
+# Dictionary types compared as numbers, every other type is compared as text
+NUMERIC_TYPES = frozenset(('INT', 'LENGTH', 'SEQNUM', 'NUMINGROUP', 'DAYOFMONTH', 'TAGNUM', 'FLOAT', 'QTY', 'PRICE', 'PRICEOFFSET', 'AMT', 'PERCENTAGE'))
+KEYWORDS = ('and', 'or', 'not')
+OPERATORS = {
+	'=': lambda left, right: left == right,
+	'!=': lambda left, right: left != right,
+	'<': lambda left, right: left < right,
+	'<=': lambda left, right: left <= right,
+	'>': lambda left, right: left > right,
+	'>=': lambda left, right: left >= right,
+}
+
+TOKEN_RE = re.compile(r'\s*(?:(\(|\))|(<=|>=|!=|=|<|>)|"([^"]*)"|([^\s()=<>!"]+))')
+
+class QueryError(ValueError):
+	pass
+
+def tokenize_query(text: str) -> list:
+	# (kind, text) pairs, kind is one of paren, op, value, word
+	tokens = []
+	pos = 0
+	text = text.rstrip()
+	while pos < len(text):
+		match = TOKEN_RE.match(text, pos)
+		if match is None or match.end() == pos:
+			raise QueryError(f"Unexpected character '{text[pos:].strip()[:1]}' in query")
+		paren, op, quoted, word = match.groups()
+		if paren:
+			tokens.append(('paren', paren))
+		elif op:
+			tokens.append(('op', op))
+		elif quoted is not None:
+			tokens.append(('value', quoted))
+		else:
+			tokens.append(('word', word))
+		pos = match.end()
+	return tokens
+
+class FixQuery():
+	# Compiled filter evaluated on the raw tag=value tokens of a message, e.g. 35=D and 55=MSFT and 38>5000.
+	# Terms are 'field op value' or just 'field' for presence, fields are tag numbers or dictionary names,
+	# combined with and/or/not and parentheses, adjacent terms are and-ed.
+	def __init__(self, text: str, fix_dict: FixDictionary = None) -> None:
+		self.text = text
+		self.fix_dict = fix_dict
+		# Tags, as text, whose values the predicate needs
+		self.tags = set()
+		# (tag, value) text equalities every match must contain, checked on the raw text before tokenizing
+		self.required_pairs = []
+		self.tokens = tokenize_query(text)
+		self.pos = 0
+		if not self.tokens:
+			raise QueryError('Empty query')
+		self.predicate = self.parse_or(True)
+		if self.pos < len(self.tokens):
+			raise QueryError(f"Unexpected '{self.tokens[self.pos][1]}' in query")
+		del self.tokens
+
+	def peek(self) -> tuple:
+		return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+	def parse_or(self, top_level: bool = False):
+		terms = [self.parse_and(top_level)]
+		while self.peek()[0] == 'word' and self.peek()[1].lower() == 'or':
+			self.pos += 1
+			terms.append(self.parse_and())
+		if len(terms) > 1:
+			# Literal prefiltering only holds when every match needs the pair
+			if top_level:
+				self.required_pairs = []
+			return lambda fields: any(term(fields) for term in terms)
+		return terms[0]
+
+	def parse_and(self, top_level: bool = False):
+		terms = [self.parse_not(top_level)]
+		while True:
+			kind, text = self.peek()
+			if kind == 'word' and text.lower() == 'and':
+				self.pos += 1
+			elif kind is None or text == ')' or (kind == 'word' and text.lower() == 'or'):
+				break
+			terms.append(self.parse_not(top_level))
+		if len(terms) > 1:
+			return lambda fields: all(term(fields) for term in terms)
+		return terms[0]
+
+	def parse_not(self, top_level: bool = False):
+		kind, text = self.peek()
+		if kind == 'word' and text.lower() == 'not':
+			self.pos += 1
+			term = self.parse_not()
+			return lambda fields: not term(fields)
+		if (kind, text) == ('paren', '('):
+			self.pos += 1
+			term = self.parse_or()
+			if self.peek() != ('paren', ')'):
+				raise QueryError("Missing ')' in query")
+			self.pos += 1
+			return term
+		return self.parse_term(top_level)
+
+	def parse_term(self, top_level: bool = False):
+		kind, text = self.peek()
+		if kind != 'word' or text.lower() in KEYWORDS:
+			raise QueryError(f"Expected a field, got '{text}'" if text else 'Query ends where a field is expected')
+		self.pos += 1
+		tag = self.resolve_tag(text)
+		self.tags.add(tag)
+		if self.peek()[0] != 'op':
+			return lambda fields: tag in fields
+		op = self.tokens[self.pos][1]
+		self.pos += 1
+		kind, value = self.peek()
+		if kind not in ('word', 'value'):
+			raise QueryError(f"Expected a value after '{text}{op}'")
+		self.pos += 1
+		compare = OPERATORS[op]
+
+		if self.is_numeric(int(tag), value):
+			try:
+				number = float(value)
+			except ValueError:
+				raise QueryError(f"'{value}' is not a number") from None
+			def numeric_term(fields):
+				for raw in fields.get(tag, ()):
+					try:
+						if compare(float(raw), number):
+							return True
+					except ValueError:
+						pass
+				return False
+			return numeric_term
+
+		if op == '=' and top_level:
+			self.required_pairs.append((tag, value))
+		return lambda fields: any(compare(raw, value) for raw in fields.get(tag, ()))
+
+	def resolve_tag(self, field: str) -> str:
+		if field.isdigit():
+			return str(int(field))
+		tag = self.fix_dict.field_numbers.get(field) if self.fix_dict else None
+		if tag is None:
+			raise QueryError(f"Unknown field '{field}'")
+		return str(tag)
+
+	def is_numeric(self, tag: int, value: str) -> bool:
+		field_type = self.fix_dict.field_types.get(tag) if self.fix_dict else None
+		if field_type is not None:
+			return field_type in NUMERIC_TYPES
+		# Without a dictionary type numbers are still compared as numbers
+		try:
+			float(value)
+		except ValueError:
+			return False
+		return True
+
+	def match(self, msg: str, delim: str = '|') -> bool:
+		for tag, value in self.required_pairs:
+			literal = f'{delim}{tag}={value}{delim}'
+			if literal not in msg and not msg.startswith(literal[1:]) and not msg.rstrip().endswith(literal[:-1]):
+				return False
+		fields = {}
+		tags = self.tags
+		for token in msg.split(delim):
+			tag, _, value = token.partition('=')
+			if tag in tags:
+				value = value.rstrip('\r\n')
+				values = fields.get(tag)
+				if values is None:
+					fields[tag] = [value]
+				else:
+					values.append(value)
+		return self.predicate(fields)
@@ -0,0 +1,191 @@
+import os
+import mmap
+from collections import namedtuple
+
+# A framed message inside a larger buffer, text keeps its original delimiter
+RawMessage = namedtuple('RawMessage', ['offset', 'text', 'delim'])
+
+BEGIN_MARKER = b'8=FIX'
+TRAILER_MARKER = b'10='
+DIGITS = b'0123456789'
+VERSION_BYTES = b'FIXT.0123456789SP'
+LINE_BREAKS = b'\r\n'
+
+def detect_delimiter(msg: str, default: str = '|') -> str:
+	# The delimiter is whatever follows the BeginString value, e.g. 8=FIX.4.4|9=...
+	start = msg.find('8=')
+	if start < 0:
+		return default
+	index = start + 2
+	while index < len(msg) and msg[index] in 'FIXT.0123456789SP':
+		index += 1
+	return msg[index] if index < len(msg) and msg[index] not in '\r\n' else default
+
+def find_message(data, pos: int = 0, end: int = None, final: bool = True) -> tuple:
+	# Returns (begin, stop, delim) of the next message at or after pos, or None when there is none.
+	# With final=False a message running into the end of the buffer is left for the next read.
+	end = len(data) if end is None else end
+	while True:
+		begin = data.find(BEGIN_MARKER, pos, end)
+		if begin < 0:
+			return None
+		# Skip values that merely contain 8=FIX, e.g. 58=FIX...
+		if begin > 0 and data[begin - 1] in DIGITS:
+			pos = begin + 1
+			continue
+		break
+
+	index = begin + 2
+	while index < end and data[index] in VERSION_BYTES:
+		index += 1
+	if index >= end:
+		return None if not final else (begin, end, b'\x01')
+	delim = data[index:index + 1]
+
+	# Jump straight to the trailer when BodyLength is present and consistent
+	trailer = -1
+	if data[index + 1:index + 3] == b'9=':
+		length_end = data.find(delim, index + 3, end)
+		length_text = data[index + 3:length_end] if length_end >= 0 else b''
+		if length_text.isdigit():
+			checksum_start = length_end + 1 + int(length_text)
+			if data[checksum_start:checksum_start + 3] == TRAILER_MARKER and data[checksum_start - 1:checksum_start] == delim:
+				trailer = checksum_start
+	if trailer < 0:
+		next_begin = data.find(BEGIN_MARKER, index, end)
+		search_end = next_begin if next_begin >= 0 else end
+		trailer = data.find(delim + TRAILER_MARKER, index, search_end)
+		if trailer >= 0:
+			trailer += len(delim)
+		elif next_begin >= 0:
+			# Truncated message, hand over everything up to the next one so it can be reported
+			stop = next_begin
+			while stop > begin and data[stop - 1] not in LINE_BREAKS and data[stop - 1:stop] != delim:
+				stop -= 1
+			stop = stop if stop > begin else next_begin
+			while stop > begin and data[stop - 1] in LINE_BREAKS:
+				stop -= 1
+			return begin, stop, delim
+		elif not final:
+			return None
+		else:
+			stop = begin
+			while stop < end and data[stop] not in LINE_BREAKS:
+				stop += 1
+			return begin, stop, delim
+
+	stop = trailer + 3
+	while stop < end and data[stop] in DIGITS:
+		stop += 1
+	if stop >= end and not final:
+		return None
+	if data[stop:stop + 1] == delim:
+		stop += 1
+	return begin, stop, delim
+
+def split_messages(data, start: int = 0, end: int = None):
+	pos = start
+	while True:
+		found = find_message(data, pos, end)
+		if found is None:
+			return
+		begin, stop, delim = found
+		yield RawMessage(begin, data[begin:stop].decode('latin-1'), delim.decode('latin-1'))
+		pos = stop
+
+def split_text(text: str) -> list:
+	# Messages in pasted text, framed by 8=...10=xxx like a log. Text without any BeginString is split by line,
+	# every line with a MsgType counting as one message. Line breaks inside a message are dropped.
+	# Characters outside latin-1 become one placeholder byte each, so offsets into data are offsets into text
+	data = text.encode('latin-1', 'replace')
+	messages = []
+	pos = 0
+	while True:
+		found = find_message(data, pos)
+		if found is None:
+			break
+		begin, stop, _ = found
+		msg = text[begin:stop].replace('\r', '').replace('\n', '')
+		messages.append(RawMessage(begin, msg, detect_delimiter(msg)))
+		pos = stop
+	if messages:
+		return messages
+	offset = 0
+	for line in text.splitlines(keepends=True):
+		msg = line.strip()
+		if '35=' in msg:
+			messages.append(RawMessage(offset, msg, detect_delimiter(msg)))
+		offset += len(line)
+	return messages
+
+def iter_file_messages(path: str):
+	# The file is memory mapped so only the pages being framed are resident, whatever the file size
+	with open(path, 'rb') as log_file:
+		try:
+			data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# Empty files cannot be mapped
+			return
+		try:
+			yield from split_messages(data)
+		finally:
+			data.close()
+
+class MessageFramer():
+	# Incremental framing over chunks of a stream, only the unframed tail is kept between chunks
+	def __init__(self, offset: int = 0) -> None:
+		self.buffer = bytearray()
+		self.buffer_offset = offset
+
+	def reset(self, offset: int = 0):
+		self.buffer.clear()
+		self.buffer_offset = offset
+
+	def feed(self, chunk: bytes, final: bool = False) -> list:
+		self.buffer += chunk
+		messages = []
+		pos = 0
+		while True:
+			found = find_message(self.buffer, pos, final=final)
+			if found is None:
+				break
+			begin, stop, delim = found
+			messages.append(RawMessage(self.buffer_offset + begin, self.buffer[begin:stop].decode('latin-1'), delim.decode('latin-1')))
+			pos = stop
+		# Keep anything after the last framed message, it may be the start of the next one
+		next_begin = self.buffer.find(BEGIN_MARKER, pos)
+		keep_from = next_begin if next_begin >= 0 else max(pos, len(self.buffer) - len(BEGIN_MARKER))
+		del self.buffer[:keep_from]
+		self.buffer_offset += keep_from
+		return messages
+
+def iter_stream_messages(stream, chunk_size: int = 1 << 20):
+	# Frames messages from a binary stream such as stdin
+	framer = MessageFramer()
+	while True:
+		chunk = stream.read(chunk_size)
+		yield from framer.feed(chunk, final=not chunk)
+		if not chunk:
+			return
+
+class FileTailer():
+	# Follows a growing log, each read only touches the bytes appended since the previous one
+	def __init__(self, path: str, from_start: bool = False, max_read: int = 4 << 20) -> None:
+		self.path = path
+		self.max_read = max_read
+		self.offset = 0 if from_start else os.path.getsize(path)
+		self.framer = MessageFramer(self.offset)
+
+	def read_new(self) -> list:
+		size = os.path.getsize(self.path)
+		if size < self.offset:
+			# Truncated or rotated, start over from the beginning of the new file
+			self.offset = 0
+			self.framer.reset(0)
+		if size == self.offset:
+			return []
+		with open(self.path, 'rb') as log_file:
+			log_file.seek(self.offset)
+			chunk = log_file.read(min(size - self.offset, self.max_read))
+		self.offset += len(chunk)
+		return self.framer.feed(chunk)
@@ -0,0 +1,369 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import configparser
+import multiprocessing
+from collections import deque
+from message_parser import MessageParser, ENGINE_NATIVE, ENGINES
+from fix_dictionary import DictionaryRegistry, read_version
+from fix_stream import iter_file_messages, iter_stream_messages
+from fix_query import FixQuery, QueryError
+from decode_server import DecodeClient
+from message_validator import issue_path
+from fix_integrity import IntegrityProblem, check_file, check_messages, describe_problem
+from message_columns import ColumnBuilder, field_value, save_columns, np
+from order_chains import OrderTracker
+
+basedir = os.path.dirname(__file__)
+
+CSV_COLUMNS = ['source', 'offset', 'section', 'path', 'tag', 'name', 'value', 'enum']
+
+def read_parser_config(config_path: str) -> dict:
+	# Same dictionary options as the viewer's app_config.ini, paths are relative to the config file
+	config_dir = os.path.dirname(os.path.abspath(config_path))
+	app_config = configparser.ConfigParser()
+	if len(app_config.read(config_path)) == 0 or 'CONFIG' not in app_config.sections():
+		return {}
+	config = app_config['CONFIG']
+	options = {}
+	if config.get('TransportDataDictionary') and config.get('AppDataDictionary'):
+		options['data_dict_path'] = os.path.join(config_dir, config['TransportDataDictionary'])
+		options['app_dict_path'] = os.path.join(config_dir, config['AppDataDictionary'])
+	elif config.get('DataDictionary'):
+		options['data_dict_path'] = os.path.join(config_dir, config['DataDictionary'])
+	if config.get('ParserEngine'):
+		options['engine'] = config['ParserEngine'].lower()
+	if config.get('DictionaryCacheDir'):
+		options['cache_dir'] = os.path.join(config_dir, config['DictionaryCacheDir'])
+	if config.get('PrebuiltDictionaryCacheDir'):
+		options['prebuilt_cache_dir'] = os.path.join(config_dir, config['PrebuiltDictionaryCacheDir'])
+	if config.get('DictionaryDir'):
+		options['dictionary_dir'] = os.path.join(config_dir, config['DictionaryDir'])
+	try:
+		options['auto_select'] = config.getboolean('AutoSelectDictionary', True)
+	except ValueError:
+		print('Encountered value error in setting config', file=sys.stderr)
+	return options
+
+def build_parser(options: dict) -> MessageParser:
+	registry = None
+	dictionary_dir = options.get('dictionary_dir')
+	if options.get('auto_select', True) and dictionary_dir and os.path.isdir(dictionary_dir):
+		app_dict_path = options.get('app_dict_path')
+		registry = DictionaryRegistry.from_directory(dictionary_dir, read_version(app_dict_path) if app_dict_path else None, options.get('cache_dir'), options.get('prebuilt_cache_dir'))
+	return MessageParser(options.get('data_dict_path'), options.get('app_dict_path'), options.get('engine', ENGINE_NATIVE), options.get('cache_dir'), options.get('prebuilt_cache_dir'), registry)
+
+# Each worker process keeps its own warm parser for its whole lifetime
+_worker_parser = None
+_worker_format = None
+_worker_query = None
+_worker_columns = None
+_worker_check = True
+_worker_validate = False
+
+def init_worker(options: dict, output_format: str, query_text: str = None, columns: list = None, check: bool = True, validate: bool = False):
+	global _worker_parser, _worker_format, _worker_query, _worker_columns, _worker_check, _worker_validate
+	_worker_parser = build_parser(options)
+	_worker_format = output_format
+	_worker_query = _worker_parser.compile_query(query_text) if query_text else None
+	_worker_columns = columns
+	_worker_check = check
+	_worker_validate = validate
+
+def format_decoded(source: str, decoded, output_format: str, problems: list = (), validation: list = ()) -> list:
+	# validation is a list of (path, tag, text) for each structural problem of the message
+	if output_format == 'csv':
+		rows = [format_problem(source, problem, output_format) for problem in problems]
+		rows += [[source, decoded.offset, 'validation', path, tag, '', '', text] for path, tag, text in validation]
+		if decoded.error is not None:
+			return rows + [[source, decoded.offset, 'error', '', '', type(decoded.error).__name__, decoded.raw, str(decoded.error)]]
+		return rows + [[source, decoded.offset, section, path, elem.get('number'), elem.get('name', ''), elem.get('raw', ''), elem.get('enum', '')]
+			for section, path, elem in MessageParser.iter_tree_fields(decoded.tree)]
+	record = {'source': source, 'offset': decoded.offset}
+	if problems:
+		record['integrity'] = '; '.join(describe_problem(problem) for problem in problems)
+	if validation:
+		record['validation'] = [{'path': path, 'problem': text} for path, _, text in validation]
+	if decoded.error is not None:
+		record['raw'] = decoded.raw
+		record['error'] = f'[{type(decoded.error).__name__}Error] {decoded.error}'
+	else:
+		record.update(MessageParser.tree_to_dict(decoded.tree))
+	return [json.dumps(record)]
+
+def format_problem(source: str, problem: IntegrityProblem, output_format: str):
+	if output_format == 'csv':
+		return [source, problem.offset, 'integrity', '', '9' if problem.field == 'BodyLength' else '10', problem.field, problem.actual, describe_problem(problem)]
+	return json.dumps({'source': source, 'offset': problem.offset, 'field': problem.field, 'expected': problem.expected, 'actual': problem.actual, 'integrity': describe_problem(problem)})
+
+def check_batch(batch: list) -> list:
+	source, raw_messages = batch
+	problems = check_messages(raw_messages)
+	return [format_problem(source, problem, _worker_format) for offset in sorted(problems) for problem in problems[offset]]
+
+def decode_batch(batch: list) -> list:
+	source, raw_messages = batch
+	output = []
+	if _worker_format == 'npz':
+		# Only the raw values of the selected tags go back to the main process, which builds the columns
+		compact = _worker_parser.engine == ENGINE_NATIVE
+		for decoded in _worker_parser.parse_many(raw_messages, skip_errors=True, query=_worker_query, compact=compact):
+			output.append((source, decoded.offset, [field_value(decoded.tree, tag) for tag in _worker_columns]))
+		return output
+	# BodyLength and CheckSum are checked for the whole batch at once, problems are reported next to the decoded message
+	problems = check_messages(raw_messages) if _worker_check else {}
+	for decoded in _worker_parser.parse_many(raw_messages, query=_worker_query, compact=_worker_validate):
+		validation = ()
+		if _worker_validate and decoded.tree is not None:
+			message = decoded.tree
+			validation = [(issue_path(message, issue), message.tag(issue.index) if issue.index >= 0 and issue.entry is None else '', issue.text) for issue in _worker_parser.validate_compact(message)]
+			decoded = decoded._replace(tree=message.to_tree())
+		output.extend(format_decoded(source, decoded, _worker_format, problems.get(decoded.offset, ()), validation))
+	return output
+
+def iter_batches(inputs: list, batch_size: int):
+	for source in inputs:
+		if source == '-':
+			messages = iter_stream_messages(sys.stdin.buffer)
+		else:
+			messages = iter_file_messages(source)
+		batch = []
+		for raw in messages:
+			batch.append(raw)
+			if len(batch) >= batch_size:
+				yield source, batch
+				batch = []
+		if batch:
+			yield source, batch
+
+def ordered_map(pool, func, iterable, max_pending: int):
+	# Like pool.imap, but stops reading ahead after max_pending batches so memory stays bounded
+	pending = deque()
+	for item in iterable:
+		pending.append(pool.apply_async(func, (item,)))
+		if len(pending) >= max_pending:
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
+
+def write_columns(rows, columns: list, fix_dict, output_path: str):
+	builder = ColumnBuilder(columns, fix_dict)
+	sources = []
+	for batch_rows in rows:
+		for source, offset, values in batch_rows:
+			sources.append(source)
+			builder.add_values(offset, values)
+	table = builder.to_columns()
+	table['source'] = np.array(sources, dtype=str)
+	save_columns(output_path, table)
+
+def write_output(rows, output_format: str, output):
+	if output_format == 'csv':
+		writer = csv.writer(output)
+		writer.writerow(CSV_COLUMNS)
+		for batch_rows in rows:
+			writer.writerows(batch_rows)
+	else:
+		for batch_rows in rows:
+			for line in batch_rows:
+				output.write(line)
+				output.write('\n')
+
+def check_inputs(args) -> int:
+	# No dictionary is needed, files are checked in place through mmap and stdin a batch at a time
+	global _worker_format
+	_worker_format = 'csv' if args.format == 'csv' else 'jsonl'
+	output = open(args.output, 'w', newline='') if args.output else sys.stdout
+	found = False
+	try:
+		def rows():
+			nonlocal found
+			for source in args.inputs:
+				if source == '-':
+					for batch_rows in map(check_batch, iter_batches([source], max(args.batch_size, 1))):
+						found = found or bool(batch_rows)
+						yield batch_rows
+				else:
+					batch_rows = [format_problem(source, problem, _worker_format) for problem in check_file(source)]
+					found = found or bool(batch_rows)
+					yield batch_rows
+		write_output(rows(), _worker_format, output)
+	except BrokenPipeError:
+		pass
+	finally:
+		if args.output:
+			output.close()
+	return 1 if found else 0
+
+def track_inputs(args) -> int:
+	# Order chains need no dictionary or decoding, every message is linked by its raw ids in this process
+	try:
+		query = FixQuery(args.query) if args.query else None
+	except QueryError as error:
+		print(f'Invalid query: {error}', file=sys.stderr)
+		return 2
+	tracker = OrderTracker()
+	output = open(args.output, 'w', newline='') if args.output else sys.stdout
+	try:
+		def rows():
+			for source, raw_messages in iter_batches(args.inputs, max(args.batch_size, 1)):
+				if query is not None:
+					raw_messages = [raw for raw in raw_messages if query.match(raw.text, raw.delim)]
+				yield [json.dumps(chain.to_dict()) for chain in tracker.add_messages(raw_messages, source)]
+			yield [json.dumps(chain.to_dict()) for chain in tracker.flush()]
+		write_output(rows(), 'jsonl', output)
+	except BrokenPipeError:
+		pass
+	finally:
+		if args.output:
+			output.close()
+	return 0
+
+def remote_batches(client: DecodeClient, batches, query: FixQuery, check: bool, validate: bool):
+	# Filtering and integrity checks need no dictionary and stay local, only the decoding is sent to the server
+	sent = deque()
+	def texts():
+		for source, raw_messages in batches:
+			if query is not None:
+				raw_messages = [raw for raw in raw_messages if query.match(raw.text, raw.delim)]
+			if raw_messages:
+				sent.append((source, raw_messages))
+				yield [raw.text for raw in raw_messages]
+	for results in client.decode_batches(texts(), validate=validate):
+		source, raw_messages = sent.popleft()
+		problems = check_messages(raw_messages) if check else {}
+		lines = []
+		for raw, result in zip(raw_messages, results):
+			record = {'source': source, 'offset': raw.offset}
+			if raw.offset in problems:
+				record['integrity'] = '; '.join(describe_problem(problem) for problem in problems[raw.offset])
+			if 'error' in result:
+				record['raw'] = raw.text
+			record.update(result)
+			lines.append(json.dumps(record))
+		yield lines
+
+def decode_remote(args) -> int:
+	if args.format != 'jsonl':
+		print('--server only writes jsonl', file=sys.stderr)
+		return 2
+	try:
+		# Without dictionaries field names cannot be resolved, tag numbers work the same
+		query = FixQuery(args.query) if args.query else None
+	except QueryError as error:
+		print(f'Invalid query: {error}', file=sys.stderr)
+		return 2
+	output = open(args.output, 'w', newline='') if args.output else sys.stdout
+	try:
+		with DecodeClient(args.server if args.server else None) as client:
+			write_output(remote_batches(client, iter_batches(args.inputs, max(args.batch_size, 1)), query, not args.no_check, args.validate), 'jsonl', output)
+	except BrokenPipeError:
+		# Output piped into head or similar
+		pass
+	except OSError as error:
+		print(f'Decode server not available: {error}', file=sys.stderr)
+		return 2
+	finally:
+		if args.output:
+			output.close()
+	return 0
+
+def decode_inputs(args) -> int:
+	options = read_parser_config(args.config)
+	if args.data_dict:
+		options['data_dict_path'] = args.data_dict
+		options['app_dict_path'] = args.app_dict
+	if args.engine:
+		options['engine'] = args.engine
+	if not options.get('data_dict_path'):
+		print('No dictionary configured, use --data-dict or --config', file=sys.stderr)
+		return 2
+	if args.validate and options.get('engine', ENGINE_NATIVE) != ENGINE_NATIVE:
+		print('--validate needs the native parser engine', file=sys.stderr)
+		return 2
+	columns = None
+	if args.format == 'npz':
+		if np is None:
+			print('The npz format needs the numpy module', file=sys.stderr)
+			return 2
+		try:
+			columns = [int(tag) for tag in args.columns.split(',')] if args.columns else None
+		except ValueError:
+			columns = None
+		if not columns or not args.output:
+			print('The npz format needs --columns with tag numbers and an output file', file=sys.stderr)
+			return 2
+	if args.query:
+		# Report a bad query once here rather than from every worker
+		try:
+			build_parser(options).compile_query(args.query)
+		except QueryError as error:
+			print(f'Invalid query: {error}', file=sys.stderr)
+			return 2
+
+	if columns:
+		batches = iter_batches(args.inputs, max(args.batch_size, 1))
+		fix_dict = build_parser(options).native_dictionary()
+		if args.workers <= 1:
+			init_worker(options, args.format, args.query, columns)
+			write_columns(map(decode_batch, batches), columns, fix_dict, args.output)
+		else:
+			with multiprocessing.Pool(args.workers, init_worker, (options, args.format, args.query, columns)) as pool:
+				write_columns(ordered_map(pool, decode_batch, batches, args.workers * 2), columns, fix_dict, args.output)
+		return 0
+
+	output = open(args.output, 'w', newline='') if args.output else sys.stdout
+	try:
+		batches = iter_batches(args.inputs, max(args.batch_size, 1))
+		if args.workers <= 1:
+			init_worker(options, args.format, args.query, None, not args.no_check, args.validate)
+			write_output(map(decode_batch, batches), args.format, output)
+		else:
+			with multiprocessing.Pool(args.workers, init_worker, (options, args.format, args.query, None, not args.no_check, args.validate)) as pool:
+				write_output(ordered_map(pool, decode_batch, batches, args.workers * 2), args.format, output)
+	except BrokenPipeError:
+		# Output piped into head or similar
+		pass
+	finally:
+		if args.output:
+			output.close()
+	return 0
+
+def main(argv: list = None) -> int:
+	arg_parser = argparse.ArgumentParser(description='Decode FIX messages from log files without the viewer')
+	arg_parser.add_argument('inputs', nargs='*', default=['-'], help="log files to decode, '-' reads stdin (default)")
+	arg_parser.add_argument('-f', '--format', choices=('jsonl', 'csv', 'npz'), default='jsonl', help='output format, npz writes one NumPy column per --columns tag')
+	arg_parser.add_argument('-o', '--output', help='output file, stdout by default')
+	arg_parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='number of decoding processes')
+	arg_parser.add_argument('-b', '--batch-size', type=int, default=500, help='messages sent to a worker at a time')
+	arg_parser.add_argument('-c', '--config', default=os.path.join(basedir, 'app_config.ini'), help='config file with the dictionary options')
+	arg_parser.add_argument('--data-dict', help='data or transport dictionary, overrides the config')
+	arg_parser.add_argument('--app-dict', help='application dictionary, overrides the config')
+	arg_parser.add_argument('--engine', choices=ENGINES, help='parser engine, overrides the config')
+	arg_parser.add_argument('--columns', help='comma separated tags for the npz format, e.g. 52,60,55,38')
+	arg_parser.add_argument('--no-check', action='store_true', help='skip the BodyLength/CheckSum check done before decoding')
+	arg_parser.add_argument('--validate', action='store_true', help='report missing required fields, group count/order and value problems (native engine only)')
+	arg_parser.add_argument('--check-only', action='store_true', help='only check BodyLength/CheckSum and report bad messages, exits with 1 when there are any')
+	arg_parser.add_argument('--orders', action='store_true', help='write order chains (new, replaces, fills, cancel) linked by ClOrdID/OrigClOrdID/OrderID instead of decoded messages, jsonl only')
+	arg_parser.add_argument('--server', nargs='?', const='', help='decode through a running decode_server.py (default address when none is given) instead of loading dictionaries, jsonl output only')
+	arg_parser.add_argument('-q', '--query', help="only decode messages matching a filter, e.g. '35=D and 55=MSFT and 38>5000'")
+	args = arg_parser.parse_args(argv)
+
+	try:
+		if args.check_only:
+			return check_inputs(args)
+		if args.orders:
+			return track_inputs(args)
+		if args.server is not None:
+			return decode_remote(args)
+		return decode_inputs(args)
+	except OSError as error:
+		# A missing or unreadable input, or an output file that cannot be created
+		action = 'write' if args.output and error.filename == args.output else 'read'
+		print(f'fixv: cannot {action} {error.filename}: {error.strerror}', file=sys.stderr)
+		return 2
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,58 @@
+from PyQt6 import QtCore
+from message_parser import MessageParser, ENGINE_NATIVE
+from fix_stream import FileTailer
+
+class TailWorker(QtCore.QObject):
+	# Polls the followed file on its own thread, decodes what was appended and hands it over one batch per poll
+	batch_ready = QtCore.pyqtSignal(object)
+	failed = QtCore.pyqtSignal(str)
+
+	def __init__(self, msg_parser: MessageParser, path: str, poll_ms: int = 200, max_batch: int = 5000) -> None:
+		super().__init__()
+		self.msg_parser = msg_parser
+		self.path = path
+		self.poll_ms = poll_ms
+		self.max_batch = max_batch
+		self.tailer = None
+		self.timer = None
+
+	@QtCore.pyqtSlot()
+	def start(self):
+		try:
+			self.tailer = FileTailer(self.path)
+		except OSError as error:
+			self.failed.emit(f'[{type(error).__name__}Error] {error}')
+			return
+		self.timer = QtCore.QTimer(self)
+		self.timer.timeout.connect(self.poll)
+		self.timer.start(self.poll_ms)
+
+	def poll(self):
+		try:
+			raw_messages = self.tailer.read_new()
+		except OSError as error:
+			self.timer.stop()
+			self.failed.emit(f'[{type(error).__name__}Error] {error}')
+			return
+		if not raw_messages:
+			return
+		# Messages beyond what the ring buffer holds would be evicted straight away, so they are not decoded
+		raw_messages = raw_messages[-self.max_batch:]
+		# Buffered messages are kept compact, the native engine builds them without an element per field
+		compact = self.msg_parser.engine == ENGINE_NATIVE
+		self.batch_ready.emit(list(self.msg_parser.parse_many(raw_messages, compact=compact)))
+
+class LogTail():
+	def __init__(self, msg_parser: MessageParser, path: str, poll_ms: int = 200, max_batch: int = 5000) -> None:
+		self.path = path
+		self.thread = QtCore.QThread()
+		self.worker = TailWorker(msg_parser, path, poll_ms, max_batch)
+		self.worker.moveToThread(self.thread)
+		self.thread.started.connect(self.worker.start)
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.thread.quit()
+		self.thread.wait()
@@ -1,14 +1,17 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
 
 block_cipher = None
+# Ship prebuilt dictionary snapshots when they have been generated with fix_dictionary.py, never the local dict_cache
+prebuilt_datas = [('dict_prebuilt', 'dict_prebuilt')] if os.path.isdir('dict_prebuilt') else []
 
 
 a = Analysis(
     ['app.py'],
     pathex=[],
     binaries=[],
-    datas=[('assets', 'assets'), ('dictionaries', 'dictionaries'), ('app_config.ini', '.')],
+    datas=[('assets', 'assets'), ('dictionaries', 'dictionaries'), ('app_config.ini', '.')] + prebuilt_datas,
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,126 @@
+from compact_message import CompactMessage
+from fix_dictionary import FixDictionary
+from message_parser import MessageParser, DecodedMessage, ENGINE_NATIVE
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+INT_TYPES = frozenset(('INT', 'LENGTH', 'SEQNUM', 'NUMINGROUP', 'DAYOFMONTH', 'TAGNUM'))
+FLOAT_TYPES = frozenset(('FLOAT', 'QTY', 'PRICE', 'PRICEOFFSET', 'AMT', 'PERCENTAGE'))
+TIMESTAMP_TYPES = frozenset(('UTCTIMESTAMP',))
+DATE_TYPES = frozenset(('UTCDATEONLY', 'UTCDATE', 'LOCALMKTDATE'))
+
+def field_value(msg_tree, tag: int) -> str:
+	# Raw value of the first occurrence of the tag, group entries included, or None
+	if isinstance(msg_tree, CompactMessage):
+		tags = msg_tree.tags
+		for index in range(len(tags)):
+			if tags[index] == tag:
+				return msg_tree.value(index)
+		return None
+	number = str(tag)
+	for elem in msg_tree.iter('field'):
+		if elem.get('number') == number:
+			return elem.get('raw')
+	return None
+
+def iso_timestamp(value: str) -> str:
+	# 20240102-13:14:15.678 -> 2024-01-02T13:14:15.678
+	return f'{value[0:4]}-{value[4:6]}-{value[6:8]}T{value[9:]}'
+
+def iso_date(value: str) -> str:
+	return f'{value[0:4]}-{value[4:6]}-{value[6:8]}'
+
+def convert_each(values: list, convert, missing):
+	converted = []
+	for value in values:
+		try:
+			converted.append(convert(value) if value is not None else missing)
+		except ValueError:
+			converted.append(missing)
+	return converted
+
+def to_array(values: list, field_type: str):
+	# Whole columns are converted by NumPy at once, values that do not parse fall back one by one to NaN/NaT
+	if field_type in INT_TYPES:
+		if None not in values:
+			try:
+				return np.array(values).astype(np.int64)
+			except ValueError:
+				pass
+		# Missing values need NaN, so the column becomes float
+		return np.array(convert_each(values, float, np.nan), dtype=np.float64)
+	if field_type in FLOAT_TYPES:
+		if None not in values:
+			try:
+				return np.array(values).astype(np.float64)
+			except ValueError:
+				pass
+		return np.array(convert_each(values, float, np.nan), dtype=np.float64)
+	if field_type in TIMESTAMP_TYPES or field_type in DATE_TYPES:
+		unit, to_iso = ('ns', iso_timestamp) if field_type in TIMESTAMP_TYPES else ('D', iso_date)
+		dtype = f'datetime64[{unit}]'
+		iso_values = [to_iso(value) if value is not None else 'NaT' for value in values]
+		try:
+			return np.array(iso_values, dtype=dtype)
+		except ValueError:
+			return np.array(convert_each(iso_values, lambda value: np.datetime64(value, unit), np.datetime64('NaT')), dtype=dtype)
+	return np.array(['' if value is None else value for value in values], dtype=str)
+
+class ColumnBuilder():
+	# Collects the raw values of the selected tags message by message, then turns each tag into one typed NumPy column.
+	# Columns are named after the dictionary field names, tags unknown to the dictionary keep their number.
+	def __init__(self, tags: list, fix_dict: FixDictionary = None) -> None:
+		if np is None:
+			raise ImportError('numpy module is required for columnar export')
+		self.tags = [int(tag) for tag in tags]
+		self.fix_dict = fix_dict
+		self.offsets = []
+		self.values = [[] for _ in self.tags]
+
+	def column_names(self) -> list:
+		names = []
+		for tag in self.tags:
+			name = self.fix_dict.field_name(tag) if self.fix_dict else None
+			names.append(name if name else str(tag))
+		return names
+
+	def add(self, decoded: DecodedMessage):
+		# Messages that failed to decode are left out
+		if decoded.tree is None:
+			return
+		self.add_values(decoded.offset, [field_value(decoded.tree, tag) for tag in self.tags])
+
+	def add_values(self, offset: int, values: list):
+		self.offsets.append(offset)
+		for column, value in zip(self.values, values):
+			column.append(value)
+
+	def add_many(self, messages):
+		for decoded in messages:
+			self.add(decoded)
+
+	def to_columns(self) -> dict:
+		columns = {'offset': np.array(self.offsets, dtype=np.int64)}
+		for name, tag, values in zip(self.column_names(), self.tags, self.values):
+			field_type = self.fix_dict.field_types.get(tag) if self.fix_dict else None
+			columns[name] = to_array(values, field_type)
+		return columns
+
+def build_columns(msg_parser: MessageParser, messages, tags: list, delim: str = None, query=None) -> dict:
+	# Decodes messages (strings or RawMessage) and returns {column name: array}, plus the offset of each row
+	builder = ColumnBuilder(tags, msg_parser.native_dictionary())
+	builder.add_many(msg_parser.parse_many(messages, delim, True, query, msg_parser.engine == ENGINE_NATIVE))
+	return builder.to_columns()
+
+def save_columns(path: str, columns: dict):
+	# One uncompressed array per column in a .npz file, np.load reads each column without touching the others
+	np.savez(path, **columns)
+
+def load_columns(path: str) -> dict:
+	if np is None:
+		raise ImportError('numpy module is required for columnar export')
+	with np.load(path) as data:
+		return {name: data[name] for name in data.files}
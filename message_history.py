@@ -0,0 +1,179 @@
+from collections import deque
+from message_parser import DecodedMessage
+from fix_query import FixQuery
+from compact_message import CompactMessage
+from order_chains import ORDER_MSG_TYPES, LINK_TAGS, UNKNOWN_IDS, session_key
+
+def order_session(pairs: frozenset) -> tuple:
+	# Session of an order message from its (tag, value) pairs, None for messages that are not about orders
+	fields = {tag: value for tag, value in pairs if tag in (35, 49, 56)}
+	if fields.get(35) not in ORDER_MSG_TYPES:
+		return None
+	return session_key(fields.get(49, ''), fields.get(56, ''))
+
+# Tags indexed by default: the ones worth searching by and the ones order_chain follows. Per message unique values such
+# as MsgSeqNum, SendingTime or ExecID would cost a posting per message, queries on other tags scan the raw text instead.
+# Account, ClOrdID, MsgType, OrderID, OrdStatus, OrigClOrdID, Side, Symbol, SenderCompID, TargetCompID, ExecType
+DEFAULT_INDEXED_TAGS = frozenset((1, 11, 35, 37, 39, 41, 54, 55, 49, 56, 150))
+
+# Postings longer than this become a deque, so evicting from the front stays cheap
+SHORT_POSTING_SIZE = 16
+
+# Framing fields that are different on every message and never worth searching for
+UNINDEXED_TAGS = frozenset((9, 10))
+
+class MessageHistory():
+	# Session history of decoded messages with an inverted index from (tag, value) to history ids,
+	# the oldest entries are evicted once max_entries is reached. indexed_tags=None indexes every tag.
+	def __init__(self, max_entries: int = 50000, indexed_tags: set = DEFAULT_INDEXED_TAGS) -> None:
+		self.max_entries = max_entries
+		self.indexed_tags = indexed_tags
+		self.entries = {}
+		self.index = {}
+		self.next_id = 0
+		self.first_id = 0
+
+	def __len__(self) -> int:
+		return len(self.entries)
+
+	def field_pairs(self, decoded: DecodedMessage) -> frozenset:
+		pairs = set()
+		if isinstance(decoded.tree, CompactMessage):
+			msg_tree = decoded.tree
+			for index, tag in enumerate(msg_tree.tags):
+				if tag in UNINDEXED_TAGS or (self.indexed_tags is not None and tag not in self.indexed_tags):
+					continue
+				pairs.add((tag, msg_tree.value(index)))
+			return frozenset(pairs)
+		for elem in decoded.tree.iter('field'):
+			tag = int(elem.get('number'))
+			if tag in UNINDEXED_TAGS or (self.indexed_tags is not None and tag not in self.indexed_tags):
+				continue
+			pairs.add((tag, elem.get('raw')))
+		return frozenset(pairs)
+
+	def posting(self, pair: tuple):
+		# History ids holding the (tag, value) pair, oldest first, or None
+		posting = self.index.get(pair)
+		return (posting,) if isinstance(posting, int) else posting
+
+	def add(self, decoded: DecodedMessage) -> int:
+		if decoded.tree is None:
+			return None
+		entry_id = self.next_id
+		self.next_id += 1
+		pairs = self.field_pairs(decoded)
+		self.entries[entry_id] = (decoded, pairs)
+		for pair in pairs:
+			posting = self.index.get(pair)
+			# Most values are seen once or a few times, a plain id or a short list costs far less than a deque
+			if posting is None:
+				self.index[pair] = entry_id
+			elif isinstance(posting, int):
+				self.index[pair] = [posting, entry_id]
+			elif isinstance(posting, list) and len(posting) >= SHORT_POSTING_SIZE:
+				posting = self.index[pair] = deque(posting)
+				posting.append(entry_id)
+			else:
+				posting.append(entry_id)
+		while len(self.entries) > self.max_entries:
+			self.evict_oldest()
+		return entry_id
+
+	def add_many(self, messages: list):
+		for decoded in messages:
+			self.add(decoded)
+
+	def evict_oldest(self):
+		while self.first_id not in self.entries:
+			self.first_id += 1
+		_, pairs = self.entries.pop(self.first_id)
+		# Ids are appended in order, so the evicted one is at the front of each of its postings
+		for pair in pairs:
+			posting = self.index[pair]
+			if isinstance(posting, int):
+				del self.index[pair]
+				continue
+			if isinstance(posting, list):
+				del posting[0]
+			else:
+				posting.popleft()
+			if len(posting) == 1:
+				self.index[pair] = posting[0]
+		self.first_id += 1
+
+	def clear(self):
+		self.entries.clear()
+		self.index.clear()
+		self.first_id = self.next_id
+
+	def last(self) -> DecodedMessage:
+		return self.entries[self.next_id - 1][0] if (self.next_id - 1) in self.entries else None
+
+	def search(self, criteria: list, limit: int = None) -> list:
+		# Messages containing every (tag, value) pair, oldest first, limited to the newest matches
+		if not criteria:
+			return []
+		postings = []
+		for pair in criteria:
+			posting = self.posting(pair)
+			if posting is None:
+				return []
+			postings.append(posting)
+		criteria_set = frozenset(criteria)
+		smallest = min(postings, key=len)
+		matches = []
+		for entry_id in reversed(smallest):
+			decoded, pairs = self.entries[entry_id]
+			if criteria_set <= pairs:
+				matches.append(decoded)
+				if limit is not None and len(matches) >= limit:
+					break
+		matches.reverse()
+		return matches
+
+	def search_query(self, query: FixQuery, limit: int = None) -> list:
+		# Messages matching a compiled query, oldest first. Its required tag=value pairs narrow the candidates
+		# through the index, the full query is then evaluated on the raw text of those candidates only.
+		criteria = [(int(tag), value) for tag, value in query.required_pairs
+			if int(tag) not in UNINDEXED_TAGS and (self.indexed_tags is None or int(tag) in self.indexed_tags)]
+		if criteria:
+			candidates = self.search(criteria)
+		else:
+			candidates = [decoded for decoded, _ in self.entries.values()]
+		matches = []
+		for decoded in reversed(candidates):
+			if query.match(decoded.raw, decoded.delim):
+				matches.append(decoded)
+				if limit is not None and len(matches) >= limit:
+					break
+		matches.reverse()
+		return matches
+
+	def order_chain(self, decoded: DecodedMessage) -> list:
+		# Messages of the same order as decoded, oldest first, linked the same way as order_chains.OrderTracker.
+		# Links are followed through the index from each ClOrdID, OrigClOrdID and OrderID, so only the chain's own
+		# messages are visited whatever the history size. Needs 11/41/37 and 35/49/56 among the indexed tags.
+		pairs = self.field_pairs(decoded)
+		session = order_session(pairs)
+		if session is None:
+			return []
+		pending = [pair for pair in pairs if pair[0] in LINK_TAGS and pair[1] not in UNKNOWN_IDS]
+		visited = set()
+		found = {}
+		while pending:
+			tag, value = pending.pop()
+			for link_tag, kind in LINK_TAGS.items():
+				pair = (link_tag, value)
+				if kind != LINK_TAGS[tag] or pair in visited:
+					continue
+				visited.add(pair)
+				for entry_id in self.posting(pair) or ():
+					if entry_id in found:
+						continue
+					entry, entry_pairs = self.entries[entry_id]
+					if order_session(entry_pairs) != session:
+						continue
+					found[entry_id] = entry
+					pending.extend(pair for pair in entry_pairs if pair[0] in LINK_TAGS and pair[1] not in UNKNOWN_IDS)
+		return [found[entry_id] for entry_id in sorted(found)]
@@ -0,0 +1,78 @@
+from collections import deque
+from PyQt6 import QtCore
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+from message_parser import DecodedMessage
+from compact_message import CompactMessage, SECTIONS
+
+def find_field(section, tag: str):
+	return section.find(f"field[@number='{tag}']") if section is not None else None
+
+def top_field(msg_tree, section: str, tag: str) -> tuple:
+	# (raw, enum) of a top level field of either message representation, None when the field is missing
+	if isinstance(msg_tree, CompactMessage):
+		index = msg_tree.find(int(tag), SECTIONS.index(section))
+		return (msg_tree.value(index), msg_tree.enum(index)) if index >= 0 else None
+	field = find_field(msg_tree.find(section), tag)
+	return (field.get('raw'), field.get('enum')) if field is not None else None
+
+def message_summary(decoded: DecodedMessage) -> str:
+	# One line description of a decoded message for list views
+	if decoded.tree is None:
+		return f'[{type(decoded.error).__name__}Error] {decoded.error}'
+	parts = []
+	msg_type = top_field(decoded.tree, 'header', '35')
+	if msg_type is not None:
+		parts.append(f'{msg_type[0]} {msg_type[1]}' if msg_type[1] else msg_type[0])
+	sender, target = top_field(decoded.tree, 'header', '49'), top_field(decoded.tree, 'header', '56')
+	if sender is not None and target is not None:
+		parts.append(f'{sender[0]}->{target[0]}')
+	for section, tag in (('header', '34'), ('body', '11'), ('body', '55')):
+		field = top_field(decoded.tree, section, tag)
+		if field is not None:
+			parts.append(f'{tag}={field[0]}')
+	return '  '.join(parts)
+
+class MessageListModel(QAbstractListModel):
+	# Ring buffer of decoded messages, the oldest rows are dropped once max_rows is reached (None for unbounded)
+	def __init__(self, max_rows: int = 5000, parent: QtCore.QObject = None) -> None:
+		super().__init__(parent)
+		self.messages = deque(maxlen=max_rows)
+
+	def message(self, row: int) -> DecodedMessage:
+		return self.messages[row]
+
+	def set_messages(self, messages: list):
+		self.beginResetModel()
+		self.messages.clear()
+		self.messages.extend(messages)
+		self.endResetModel()
+
+	def append_messages(self, messages: list):
+		max_rows = self.messages.maxlen
+		if max_rows is not None and len(messages) > max_rows:
+			messages = messages[-max_rows:]
+		overflow = min(len(self.messages), len(self.messages) + len(messages) - max_rows) if max_rows is not None else 0
+		if overflow > 0:
+			self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+			for _ in range(overflow):
+				self.messages.popleft()
+			self.endRemoveRows()
+		if messages:
+			self.beginInsertRows(QModelIndex(), len(self.messages), len(self.messages) + len(messages) - 1)
+			self.messages.extend(messages)
+			self.endInsertRows()
+
+	def clear(self):
+		self.set_messages([])
+
+	def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+		return 0 if parent.isValid() else len(self.messages)
+
+	def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+		if not index.isValid():
+			return None
+		if role == Qt.ItemDataRole.DisplayRole:
+			return message_summary(self.messages[index.row()])
+		if role == Qt.ItemDataRole.ToolTipRole:
+			return self.messages[index.row()].raw
+		return None
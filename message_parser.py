@@ -1,14 +1,97 @@
-import quickfix as qf
+import os
 import re
+import copy
+import importlib.util
+import threading
 import xml.etree.ElementTree as ET
+from array import array
+from collections import namedtuple
+from fix_dictionary import FixDictionary, FieldLayout, DictionarySet, DictionaryRegistry, load_dictionary, loaded_dictionaries
+from fix_stream import RawMessage, detect_delimiter, iter_file_messages
+from decode_cache import DecodeCache, estimate_size
+from parse_timing import StageTimer
+from fix_query import FixQuery
+from compact_message import CompactMessage, HEADER, BODY, TRAILER
+from message_validator import MessageValidator
+
+# quickfix is a large extension module, it is only imported once the quickfix engine is used
+qf = None
+
+ENGINE_NATIVE = 'native'
+ENGINE_QUICKFIX = 'quickfix'
+ENGINES = (ENGINE_NATIVE, ENGINE_QUICKFIX)
+
+# Result of a bulk decode, tree is None and error is set when the message could not be parsed
+DecodedMessage = namedtuple('DecodedMessage', ['offset', 'raw', 'delim', 'tree', 'error'])
+
+class InvalidMessage(Exception):
+	pass
+
+# quickfix dictionaries are shared the same way as the native ones in fix_dictionary
+_qf_dictionary_store = {}
+
+def import_quickfix():
+	global qf
+	if qf is None:
+		try:
+			import quickfix
+		except ImportError:
+			raise ImportError('quickfix module is required for the quickfix parser engine') from None
+		qf = quickfix
+	return qf
+
+def has_quickfix() -> bool:
+	return importlib.util.find_spec('quickfix') is not None
+
+_qf_dictionary_lock = threading.Lock()
+# Guards the process wide toXML dictionary of quickfix, from the path check through InitializeXML to toXML
+_qf_xml_lock = threading.Lock()
+
+def load_qf_dictionary(path: str):
+	key = os.path.abspath(path)
+	with _qf_dictionary_lock:
+		if key not in _qf_dictionary_store:
+			_qf_dictionary_store[key] = qf.DataDictionary(path)
+		return _qf_dictionary_store[key]
 
 class MessageParser():
-	def __init__(self, data_dict_path: str = None, app_dict_path: str = None) -> None:
+	# quickfix keeps the dictionary used by toXML in a process wide static, so only reload it when it changes.
+	# Decoders on other threads (decode worker, log tail, decode server) share it under _qf_xml_lock, and input mixing
+	# versions reloads the XML dictionary on every version change, which is costly with the quickfix engine.
+	xml_dictionary_path = None
+	xml_init_count = 0
+
+	def __init__(self, data_dict_path: str = None, app_dict_path: str = None, engine: str = ENGINE_NATIVE, cache_dir: str = None, prebuilt_cache_dir: str = None, registry: DictionaryRegistry = None, decode_cache_entries: int = 0, decode_cache_bytes: int = 0, stage_timer: StageTimer = None) -> None:
+		if engine not in ENGINES:
+			raise ValueError(f'Unknown parser engine: {engine}')
 		self.data_dictionary_path = data_dict_path
 		self.app_dictionary_path = app_dict_path
-		self.data_dictionary = qf.DataDictionary(data_dict_path) if data_dict_path else None
-		self.app_dictionary = qf.DataDictionary(app_dict_path) if app_dict_path else None
-		self.field_dictionary = self.app_dictionary if self.app_dictionary else self.data_dictionary
+		self.engine = engine
+		# With a registry each message picks its dictionaries from BeginString/ApplVerID, the configured ones are the fallback
+		self.registry = registry
+		# Repeat decodes of the same text are served from the cache, the returned tree is shared and must not be modified
+		self.decode_cache = DecodeCache(decode_cache_entries, decode_cache_bytes) if decode_cache_entries or decode_cache_bytes else None
+		self.cache_key_prefix = (engine, data_dict_path, app_dict_path, registry is not None)
+		# Per stage timing is only measured when a timer is set, otherwise each stage costs a single None check
+		self.stage_timer = stage_timer
+		# One MessageValidator per dictionary set, each compiling message layouts on first use
+		self.validators = {}
+		if engine == ENGINE_QUICKFIX:
+			import_quickfix()
+			self.data_dictionary = load_qf_dictionary(data_dict_path) if data_dict_path else None
+			self.app_dictionary = load_qf_dictionary(app_dict_path) if app_dict_path else None
+			self.field_dictionary = self.app_dictionary if self.app_dictionary else self.data_dictionary
+		else:
+			transport_fix_dict = load_dictionary(data_dict_path, cache_dir, prebuilt_cache_dir) if data_dict_path else None
+			app_fix_dict = load_dictionary(app_dict_path, cache_dir, prebuilt_cache_dir) if app_dict_path else None
+			self.dictionary_set = DictionarySet(transport_fix_dict, app_fix_dict) if transport_fix_dict or app_fix_dict else None
+
+	def untimed(self) -> 'MessageParser':
+		# Same dictionaries, decode cache and validators without the stage timer, for bulk decodes (batches, followed logs)
+		# that would otherwise skew the timings of interactive decodes
+		msg_parser = copy.copy(self)
+		msg_parser.stage_timer = None
+		return msg_parser
 
 	@staticmethod
 	def format_message(message: str, delim: str='|') -> str:
@@ -19,15 +102,424 @@ class MessageParser():
 		return re.sub(f'[{delim}]', '\x01', message)
 
 	def parse_msg(self, msg: str, delim: str = '|') -> ET.Element:
-		if self.app_dictionary:
-			fix_msg = qf.Message(MessageParser.inv_format_message(msg, delim), self.data_dictionary, self.app_dictionary, False)
+		timer = self.stage_timer
+		if timer is None:
+			return self.cached_decode_msg(msg, delim)
+		timer.start()
+		try:
+			return self.cached_decode_msg(msg, delim)
+		finally:
+			timer.finish()
+
+	def cached_decode_msg(self, msg: str, delim: str = '|') -> ET.Element:
+		if self.decode_cache is None:
+			return self.decode_msg(msg, delim)
+		timer = self.stage_timer
+		msg, delim = MessageParser.normalize_message(msg, delim)
+		key = (msg, delim) + self.cache_key_prefix
+		msg_tree = self.decode_cache.get(key)
+		if timer:
+			timer.mark('cache')
+		if msg_tree is None:
+			msg_tree = self.decode_msg(msg, delim)
+			self.decode_cache.put(key, msg_tree, estimate_size(msg, delim))
+		return msg_tree
+
+	def decode_msg(self, msg: str, delim: str = '|') -> ET.Element:
+		if self.engine == ENGINE_QUICKFIX:
+			return self.parse_msg_quickfix(msg, delim)
+		return self.parse_msg_native(msg, delim)
+
+	@staticmethod
+	def normalize_message(msg: str, delim: str = '|') -> tuple:
+		# Same text pasted with SOH or the configured delimiter, or with surrounding whitespace, maps to one cache entry
+		msg = msg.strip()
+		if delim != '\x01':
+			msg = msg.replace(delim, '\x01')
+		return msg, '\x01'
+
+	def cache_stats(self) -> dict:
+		return self.decode_cache.stats() if self.decode_cache else None
+
+	def parse_msg_quickfix(self, msg: str, delim: str = '|') -> ET.Element:
+		timer = self.stage_timer
+		data_dictionary, app_dictionary = self.data_dictionary, self.app_dictionary
+		xml_dictionary_path = self.app_dictionary_path if self.app_dictionary_path else self.data_dictionary_path
+		if self.registry:
+			data_path, app_path = self.registry.resolve_paths(*MessageParser.peek_version(msg, delim))
+			if data_path:
+				data_dictionary = load_qf_dictionary(data_path)
+				app_dictionary = load_qf_dictionary(app_path) if app_path else None
+				xml_dictionary_path = app_path if app_path else data_path
+		qf_msg_string = MessageParser.inv_format_message(msg.strip(), delim)
+		if timer:
+			timer.mark('normalize')
+		if app_dictionary:
+			fix_msg = qf.Message(qf_msg_string, data_dictionary, app_dictionary, False)
 		else:
-			fix_msg = qf.Message(MessageParser.inv_format_message(msg, delim), self.data_dictionary, False)
-		fix_msg.InitializeXML(self.app_dictionary_path if self.app_dictionary_path else self.data_dictionary_path)
-		# print(fix_msg.toXML())
-		return ET.fromstring(fix_msg.toXML())
+			fix_msg = qf.Message(qf_msg_string, data_dictionary, False)
+		if timer:
+			timer.mark('qf_message')
+		with _qf_xml_lock:
+			if MessageParser.xml_dictionary_path != xml_dictionary_path:
+				fix_msg.InitializeXML(xml_dictionary_path)
+				MessageParser.xml_dictionary_path = xml_dictionary_path
+				MessageParser.xml_init_count += 1
+				if timer:
+					timer.mark('initialize_xml')
+			# print(fix_msg.toXML())
+			xml_string = fix_msg.toXML()
+		if timer:
+			timer.mark('to_xml')
+		msg_tree = ET.fromstring(xml_string)
+		if timer:
+			timer.mark('et_fromstring')
+		return msg_tree
+
+	def parse_many(self, messages, delim: str = None, skip_errors: bool = False, query: FixQuery = None, compact: bool = False):
+		# Lazily decodes an iterable of message strings or RawMessage, detecting the delimiter per message when not given.
+		# With a query only the messages matching it on their raw tokens are decoded, with compact the trees are CompactMessage.
+		parse = self.parse_msg_compact if compact else self.parse_msg
+		for offset, msg in enumerate(messages):
+			if isinstance(msg, RawMessage):
+				offset, msg, msg_delim = msg
+			else:
+				msg_delim = delim if delim else detect_delimiter(msg)
+			if query is not None and not query.match(msg, msg_delim):
+				continue
+			try:
+				yield DecodedMessage(offset, msg, msg_delim, parse(msg, msg_delim), None)
+			except Exception as error:
+				if not skip_errors:
+					yield DecodedMessage(offset, msg, msg_delim, None, error)
+
+	def iter_file(self, path: str, skip_errors: bool = False, query: FixQuery = None):
+		# Offsets of the decoded messages are byte offsets into the file
+		return self.parse_many(iter_file_messages(path), skip_errors=skip_errors, query=query)
+
+	def preload_dictionaries(self) -> list:
+		# Everything the registry may pick is loaded now instead of on the first message of each version
+		if self.registry is None:
+			return []
+		paths = self.registry.preload()
+		if self.engine == ENGINE_QUICKFIX:
+			for path in paths:
+				load_qf_dictionary(path)
+		return paths
+
+	def native_dictionary(self) -> FixDictionary:
+		# Field names and types of the configured dictionary, the quickfix engine reads the same XML natively
+		if self.engine == ENGINE_QUICKFIX:
+			path = self.app_dictionary_path if self.app_dictionary_path else self.data_dictionary_path
+			return load_dictionary(path) if path else None
+		return self.dictionary_set.app if self.dictionary_set else None
+
+	def compile_query(self, text: str) -> FixQuery:
+		return FixQuery(text, self.native_dictionary())
+
+	@staticmethod
+	def tree_to_dict(msg_tree: ET.Element) -> dict:
+		# Plain python form of a parsed message, used for JSON output
+		return {section.tag: MessageParser.fields_to_list(section) for section in msg_tree.iterfind('./')}
+
+	@staticmethod
+	def fields_to_list(parent: ET.Element) -> list:
+		fields = []
+		for elem in parent.iterfind('field'):
+			field = {'tag': int(elem.get('number')), 'name': elem.get('name'), 'value': elem.get('raw')}
+			if 'enum' in elem.attrib:
+				field['enum'] = elem.get('enum')
+			groups = [MessageParser.fields_to_list(group_elem) for group_elem in elem.iterfind('group')]
+			if groups:
+				field['groups'] = groups
+			fields.append(field)
+		return fields
+
+	@staticmethod
+	def iter_tree_fields(msg_tree: ET.Element):
+		# Yields (section, path, field element) for every field, path locates nested group entries e.g. 453[1].802[0].523
+		for section in msg_tree.iterfind('./'):
+			yield from MessageParser.iter_group_fields(section.tag, '', section)
+
+	@staticmethod
+	def iter_group_fields(section: str, prefix: str, parent: ET.Element):
+		for elem in parent.iterfind('field'):
+			path = f"{prefix}{elem.get('number')}"
+			yield section, path, elem
+			for index, group_elem in enumerate(elem.iterfind('group')):
+				yield from MessageParser.iter_group_fields(section, f'{path}[{index}].', group_elem)
+
+	@staticmethod
+	def dictionary_stats() -> dict:
+		return {
+			'dictionary_loads': FixDictionary.load_count,
+			'xml_initializations': MessageParser.xml_init_count,
+			'loaded_dictionaries': loaded_dictionaries(),
+		}
+
+	def select_dictionaries(self, msg: str, delim: str = '|') -> DictionarySet:
+		if self.registry:
+			dictionary_set = self.registry.dictionary_set(*MessageParser.peek_version(msg, delim))
+			if dictionary_set:
+				return dictionary_set
+		if self.dictionary_set is None:
+			raise InvalidMessage('No dictionary available for message')
+		return self.dictionary_set
+
+	@staticmethod
+	def peek_version(msg: str, delim: str = '|') -> tuple:
+		# Read BeginString and ApplVerID straight from the raw text, before choosing how to tokenize it
+		if delim != '\x01' and '\x01' in msg:
+			delim = '\x01'
+		begin_string = None
+		start = msg.find('8=')
+		# Leading whitespace is skipped like tokenize does, otherwise the message falls back to the default dictionaries
+		if start == len(msg) - len(msg.lstrip()) or (start > 0 and msg[start - 1] == delim):
+			end = msg.find(delim, start)
+			begin_string = msg[start + 2:end if end >= 0 else len(msg)].strip()
+		appl_ver_id = None
+		start = msg.find(f'{delim}1128=')
+		if start >= 0:
+			start += len(delim) + 5
+			end = msg.find(delim, start)
+			appl_ver_id = msg[start:end if end >= 0 else len(msg)]
+		return begin_string, appl_ver_id
+
+	def parse_msg_native(self, msg: str, delim: str = '|') -> ET.Element:
+		timer = self.stage_timer
+		dictionary_set = self.select_dictionaries(msg, delim)
+		if timer:
+			timer.mark('select_dictionary')
+		fields = MessageParser.tokenize(msg, delim, dictionary_set.length_tags, dictionary_set.data_tags)
+		if timer:
+			timer.mark('tokenize')
+		transport_dict = dictionary_set.transport
+
+		msg_type = next((value for tag, value in fields if tag == 35), None)
+		body_layout, body_dict = dictionary_set.message_layout(msg_type) if msg_type is not None else (None, dictionary_set.app)
+
+		message_elem = ET.Element('message')
+		header_elem = ET.SubElement(message_elem, 'header')
+		body_elem = ET.SubElement(message_elem, 'body')
+		trailer_elem = ET.SubElement(message_elem, 'trailer')
+
+		index = 0
+		count = len(fields)
+		while index < count:
+			tag, value = fields[index]
+			if transport_dict.is_header_field(tag):
+				section_elem, layout, section_dict = header_elem, transport_dict.header, transport_dict
+			elif transport_dict.is_trailer_field(tag):
+				section_elem, layout, section_dict = trailer_elem, transport_dict.trailer, transport_dict
+			else:
+				section_elem, layout, section_dict = body_elem, body_layout, body_dict
+			field_elem = MessageParser.add_field_elem(section_elem, tag, value, section_dict, dictionary_set)
+			index += 1
+			if layout is not None and tag in layout.groups:
+				index = MessageParser.parse_group(fields, index, field_elem, layout.groups[tag], section_dict, dictionary_set)
+		if timer:
+			timer.mark('build_tree')
+		return message_elem
+
+	def parse_msg_compact(self, msg: str, delim: str = '|') -> CompactMessage:
+		# Same structure as parse_msg_native, kept in arrays over the message text instead of one element per field
+		if self.engine != ENGINE_NATIVE:
+			raise ValueError('Compact messages are only built by the native parser engine')
+		timer = self.stage_timer
+		if timer:
+			timer.start()
+		try:
+			dictionary_set = self.select_dictionaries(msg, delim)
+			if timer:
+				timer.mark('select_dictionary')
+			message = MessageParser.tokenize_compact(msg, delim, dictionary_set)
+			if timer:
+				timer.mark('tokenize')
+			transport_dict = dictionary_set.transport
+			tags = message.tags
+			count = len(tags)
+			msg_type_index = next((index for index in range(count) if tags[index] == 35), -1)
+			body_layout, message.body_dict = dictionary_set.message_layout(message.value(msg_type_index)) if msg_type_index >= 0 else (None, dictionary_set.app)
+
+			message.sections = sections = array('b', bytes(count))
+			message.parents = array('i', [-1]) * count
+			message.entries = array('i', [0]) * count
+			message.spans = spans = array('i', range(1, count + 1))
+			index = 0
+			while index < count:
+				tag = tags[index]
+				if transport_dict.is_header_field(tag):
+					section, layout = HEADER, transport_dict.header
+				elif transport_dict.is_trailer_field(tag):
+					section, layout = TRAILER, transport_dict.trailer
+				else:
+					section, layout = BODY, body_layout
+				sections[index] = section
+				index += 1
+				if layout is not None and tag in layout.groups:
+					spans[index - 1] = index = MessageParser.parse_group_compact(message, index, index - 1, layout.groups[tag], section)
+			if timer:
+				timer.mark('build_compact')
+			return message
+		finally:
+			if timer:
+				timer.finish()
+
+	def validate_msg(self, msg: str, delim: str = '|') -> tuple:
+		# (CompactMessage, [ValidationIssue]) of a message, structure problems are reported rather than raised
+		if self.engine != ENGINE_NATIVE:
+			raise ValueError('Validation is only available with the native parser engine')
+		message = self.parse_msg_compact(msg, delim)
+		return message, self.validate_compact(message)
+
+	def validate_compact(self, message: CompactMessage) -> list:
+		validator = self.validators.get(message.dictionary_set)
+		if validator is None:
+			validator = self.validators[message.dictionary_set] = MessageValidator(message.dictionary_set)
+		return validator.validate(message)
+
+	@staticmethod
+	def parse_group_compact(message: CompactMessage, index: int, count_index: int, layout: FieldLayout, section: int) -> int:
+		tags, sections, parents, entries, spans = message.tags, message.sections, message.parents, message.entries, message.spans
+		count = len(tags)
+		entry = 0
+		while index < count and tags[index] == layout.delim:
+			tag = tags[index]
+			while True:
+				sections[index] = section
+				parents[index] = count_index
+				entries[index] = entry
+				index += 1
+				if tag in layout.groups:
+					spans[index - 1] = index = MessageParser.parse_group_compact(message, index, index - 1, layout.groups[tag], section)
+				if index >= count:
+					break
+				tag = tags[index]
+				if tag == layout.delim or tag not in layout.members:
+					break
+			entry += 1
+		return index
+
+	@staticmethod
+	def tokenize_compact(msg: str, delim: str, dictionary_set: DictionarySet) -> CompactMessage:
+		# Offsets based counterpart of tokenize, no substring is kept apart from the message itself
+		msg = msg.strip()
+		if delim != '\x01' and '\x01' in msg:
+			msg = msg.replace(delim, '\x01')
+			delim = '\x01'
+		message = CompactMessage(msg, delim, dictionary_set, dictionary_set.app)
+		tags, starts, stops = message.tags, message.starts, message.stops
+		length_tags, data_tags = dictionary_set.length_tags, dictionary_set.data_tags
+		delim_len = len(delim)
+		data_length = None
+		pos = 0
+		end = len(msg)
+		while pos < end:
+			stop = msg.find(delim, pos)
+			if stop < 0:
+				stop = end
+			if stop == pos:
+				pos += delim_len
+				continue
+			sep = msg.find('=', pos, stop)
+			try:
+				tag = int(msg[pos:sep if sep >= 0 else stop])
+			except ValueError:
+				raise InvalidMessage(f'Invalid tag number in field: {msg[pos:stop]}')
+			if sep < 0:
+				raise InvalidMessage(f'Missing value for tag {tag}')
+			if data_length is not None and tag in data_tags:
+				# Data fields may contain the delimiter, extend until the declared length is reached
+				while stop - sep - 1 < data_length and stop < end:
+					stop = msg.find(delim, stop + delim_len)
+					if stop < 0:
+						stop = end
+			data_length = int(msg[sep + 1:stop]) if tag in length_tags and msg[sep + 1:stop].isdigit() else None
+			tags.append(tag)
+			starts.append(sep + 1)
+			stops.append(stop)
+			pos = stop + delim_len
+		if not tags:
+			raise InvalidMessage('Message does not contain any field')
+		return message
+
+	@staticmethod
+	def parse_group(fields: list, index: int, count_elem: ET.Element, layout: FieldLayout, fix_dict: FixDictionary, dictionary_set: DictionarySet) -> int:
+		# Group entries are read for as long as the delimiter field repeats, same as quickfix without validation
+		count = len(fields)
+		while index < count and fields[index][0] == layout.delim:
+			group_elem = ET.SubElement(count_elem, 'group')
+			tag, value = fields[index]
+			while True:
+				field_elem = MessageParser.add_field_elem(group_elem, tag, value, fix_dict, dictionary_set)
+				index += 1
+				if tag in layout.groups:
+					index = MessageParser.parse_group(fields, index, field_elem, layout.groups[tag], fix_dict, dictionary_set)
+				if index >= count:
+					break
+				tag, value = fields[index]
+				if tag == layout.delim or tag not in layout.members:
+					break
+		return index
+
+	@staticmethod
+	def add_field_elem(parent: ET.Element, tag: int, value: str, fix_dict: FixDictionary, dictionary_set: DictionarySet) -> ET.Element:
+		field_elem = ET.SubElement(parent, 'field')
+		name = dictionary_set.field_name(tag, fix_dict)
+		if name:
+			field_elem.set('name', name)
+		field_elem.set('number', str(tag))
+		field_elem.set('raw', value)
+		enum = dictionary_set.enum_name(tag, value, fix_dict)
+		if enum:
+			field_elem.set('enum', enum)
+		field_elem.text = value
+		return field_elem
+
+	@staticmethod
+	def tokenize(msg: str, delim: str = '|', length_tags: set = (), data_tags: set = ()) -> list:
+		# Surrounding whitespace, e.g. from copying out of a terminal, is not part of the message
+		msg = msg.strip()
+		# Messages copied with SOH are accepted whatever the delimiter setting is, same as inv_format_message
+		if delim != '\x01' and '\x01' in msg:
+			msg = msg.replace(delim, '\x01')
+			delim = '\x01'
+		tokens = msg.split(delim)
+		fields = []
+		data_length = None
+		index = 0
+		count = len(tokens)
+		while index < count:
+			token = tokens[index]
+			index += 1
+			if not token:
+				continue
+			tag, sep, value = token.partition('=')
+			try:
+				tag = int(tag)
+			except ValueError:
+				raise InvalidMessage(f'Invalid tag number in field: {token}')
+			if not sep:
+				raise InvalidMessage(f'Missing value for tag {tag}')
+			if data_length is not None and tag in data_tags:
+				# Data fields may contain the delimiter, rejoin until the declared length is reached
+				while len(value) < data_length and index < count:
+					value += delim + tokens[index]
+					index += 1
+			data_length = int(value) if tag in length_tags and value.isdigit() else None
+			fields.append((tag, value))
+		if not fields:
+			raise InvalidMessage('Message does not contain any field')
+		return fields
 
 if __name__ == "__main__":
 	msg_parser = MessageParser('dictionaries/FIXT11.xml', 'dictionaries/FIX50SP2.xml')
 	msg_string = '8=FIX.4.4|9=224|35=D|34=1080|49=TESTBUY1|52=20180920-18:14:19.508|56=TESTSELL1|11=636730640278898634|15=USD|21=2|38=7000|40=1|54=1|55=MSFT|60=20180920-18:14:19.492|453=2|448=111|447=6|802=1|523=test1|448=222|447=8|802=2|523=test2|523=test3|528=10|10=225|'
 	msg_tree = msg_parser.parse_msg(msg_string)
+	stats_before = MessageParser.dictionary_stats()
+	for _ in range(1000):
+		msg_parser.parse_msg(msg_string)
+	# Repeated decodes and new parsers over the same paths reuse the warm dictionary store
+	MessageParser('dictionaries/FIXT11.xml', 'dictionaries/FIX50SP2.xml').parse_msg(msg_string)
+	stats_after = MessageParser.dictionary_stats()
+	print(f"Dictionary loads before: {stats_before['dictionary_loads']}, after: {stats_after['dictionary_loads']}")
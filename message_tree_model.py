@@ -0,0 +1,193 @@
+import xml.etree.ElementTree as ET
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtCore import QAbstractItemModel, QModelIndex, Qt
+from compact_message import CompactMessage, SECTIONS
+from message_validator import issue_key
+
+HEADER_LABELS = ['Tag', 'Name', 'Value']
+ISSUE_COLOR = QtGui.QColor(200, 0, 0)
+
+class TreeNode():
+	# Wraps one element of the parsed message, children and row text are only built when the view asks for them
+	__slots__ = ('elem', 'parent', 'row', '_children', '_entries')
+
+	def __init__(self, elem: ET.Element, parent: 'TreeNode' = None, row: int = 0) -> None:
+		self.elem = elem
+		self.parent = parent
+		self.row = row
+		self._children = None
+		self._entries = None
+
+	def child_count(self) -> int:
+		return len(self.elem)
+
+	def has_children(self) -> bool:
+		return len(self.elem) > 0
+
+	def child(self, row: int) -> 'TreeNode':
+		# Nodes are created per row, so a group with thousands of entries only builds the rows in view
+		if self._children is None:
+			self._children = [None] * len(self.elem)
+		node = self._children[row]
+		if node is None:
+			node = TreeNode(self.elem[row], self, row)
+			self._children[row] = node
+		return node
+
+	def entries(self) -> list:
+		if self._entries is None:
+			self._entries = row_entries(self.elem)
+		return self._entries
+
+class CompactNode():
+	# TreeNode counterpart over a CompactMessage, kind is message, section, field or group and key locates it:
+	# the section number, the field index, or the field indices of a group entry
+	__slots__ = ('message', 'kind', 'key', 'parent', 'row', '_child_keys', '_children', '_entries')
+
+	def __init__(self, message: CompactMessage, kind: str = 'message', key=None, parent: 'CompactNode' = None, row: int = 0) -> None:
+		self.message = message
+		self.kind = kind
+		self.key = key
+		self.parent = parent
+		self.row = row
+		self._child_keys = None
+		self._children = None
+		self._entries = None
+
+	def child_keys(self) -> list:
+		if self._child_keys is None:
+			if self.kind == 'message':
+				self._child_keys = list(range(len(SECTIONS)))
+			elif self.kind == 'section':
+				self._child_keys = self.message.section_fields(self.key)
+			elif self.kind == 'field':
+				self._child_keys = self.message.group_entries(self.key)
+			else:
+				self._child_keys = self.key
+		return self._child_keys
+
+	def child_count(self) -> int:
+		return len(self.child_keys())
+
+	def has_children(self) -> bool:
+		if self.kind == 'field':
+			# Cheaper than listing the entries, a field has nested ones only when its span covers more than itself
+			return self.message.spans[self.key] > self.key + 1
+		return self.child_count() > 0
+
+	def child(self, row: int) -> 'CompactNode':
+		if self._children is None:
+			self._children = [None] * self.child_count()
+		node = self._children[row]
+		if node is None:
+			child_kind = {'message': 'section', 'field': 'group'}.get(self.kind, 'field')
+			node = CompactNode(self.message, child_kind, self.child_keys()[row], self, row)
+			self._children[row] = node
+		return node
+
+	def issue_key(self) -> tuple:
+		# Same keys as message_validator.issue_key
+		if self.kind == 'section':
+			return ('section', SECTIONS[self.key])
+		if self.kind == 'group':
+			return ('entry', self.parent.key, self.row)
+		return ('field', self.key)
+
+	def entries(self) -> list:
+		if self._entries is None:
+			if self.kind == 'section':
+				self._entries = [SECTIONS[self.key], '', '']
+			elif self.kind == 'group':
+				self._entries = ['group', '', '']
+			else:
+				index = self.key
+				raw = self.message.value(index)
+				enum = self.message.enum(index)
+				name = self.message.name(index)
+				self._entries = [str(self.message.tag(index)), name if name else 'UNDEFINED', f'{raw} ({enum})' if enum else raw]
+		return self._entries
+
+def row_entries(elem: ET.Element) -> list:
+	field_tag = elem.get('number') if 'number' in elem.attrib else elem.tag
+	if elem.tag == 'field':
+		field_name = elem.get('name') if 'name' in elem.attrib else 'UNDEFINED'
+	else:
+		field_name = elem.get('name') if 'name' in elem.attrib else None
+	field_raw = elem.get('raw') if 'raw' in elem.attrib else None
+	field_enum = elem.get('enum') if 'enum' in elem.attrib else None
+	field_value = None
+	if field_raw:
+		if field_enum:
+			field_value = f'{field_raw} ({field_enum})'
+		else:
+			field_value = field_raw
+	return [field_tag, field_name if field_name else '', field_value if field_value else '']
+
+class MessageTreeModel(QAbstractItemModel):
+	def __init__(self, parent: QtCore.QObject = None) -> None:
+		super().__init__(parent)
+		self.root = None
+		self.issues = {}
+
+	def set_message(self, msg_tree, issues: list = None):
+		# Either an ElementTree from MessageParser.parse_msg or a CompactMessage, validation issues of a
+		# CompactMessage are shown in red on the rows they are about, with their text as tooltip
+		self.beginResetModel()
+		self.issues = {}
+		for issue in issues if issues else ():
+			self.issues.setdefault(issue_key(issue), []).append(issue.text)
+		if isinstance(msg_tree, CompactMessage):
+			self.root = CompactNode(msg_tree)
+		else:
+			self.root = TreeNode(msg_tree) if msg_tree is not None else None
+		self.endResetModel()
+
+	def clear(self):
+		self.set_message(None)
+
+	def node(self, index: QModelIndex) -> TreeNode:
+		return index.internalPointer() if index.isValid() else self.root
+
+	def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+		parent_node = self.node(parent)
+		if parent_node is None or not self.hasIndex(row, column, parent):
+			return QModelIndex()
+		return self.createIndex(row, column, parent_node.child(row))
+
+	def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+		if not index.isValid():
+			return QModelIndex()
+		parent_node = index.internalPointer().parent
+		if parent_node is None or parent_node is self.root:
+			return QModelIndex()
+		return self.createIndex(parent_node.row, 0, parent_node)
+
+	def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+		if parent.column() > 0:
+			return 0
+		parent_node = self.node(parent)
+		return parent_node.child_count() if parent_node is not None else 0
+
+	def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+		parent_node = self.node(parent)
+		return parent_node is not None and parent_node.has_children()
+
+	def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+		return len(HEADER_LABELS)
+
+	def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+		if not index.isValid():
+			return None
+		if self.issues and role in (Qt.ItemDataRole.ForegroundRole, Qt.ItemDataRole.ToolTipRole) and isinstance(index.internalPointer(), CompactNode):
+			texts = self.issues.get(index.internalPointer().issue_key())
+			if texts:
+				return ISSUE_COLOR if role == Qt.ItemDataRole.ForegroundRole else '\n'.join(texts)
+		if role == Qt.ItemDataRole.DisplayRole or (role == Qt.ItemDataRole.ToolTipRole and index.column() == 2):
+			value = index.internalPointer().entries()[index.column()]
+			return value if value else None
+		return None
+
+	def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+		if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+			return HEADER_LABELS[section]
+		return None
@@ -0,0 +1,181 @@
+from collections import namedtuple
+from fix_dictionary import FixDictionary, FieldLayout, DictionarySet
+from compact_message import CompactMessage, SECTIONS, HEADER, BODY, TRAILER
+
+# A structural problem of a parsed message. index is the field it is about, or the NumInGroup field of the group entry
+# when entry is set, or -1 for the whole section
+ValidationIssue = namedtuple('ValidationIssue', ['section', 'index', 'entry', 'text'])
+
+INT_TYPES = frozenset(('INT', 'LENGTH', 'SEQNUM', 'NUMINGROUP', 'DAYOFMONTH', 'TAGNUM'))
+FLOAT_TYPES = frozenset(('FLOAT', 'QTY', 'PRICE', 'PRICEOFFSET', 'AMT', 'PERCENTAGE'))
+MULTIPLE_VALUE_TYPES = frozenset(('MULTIPLEVALUESTRING', 'MULTIPLESTRINGVALUE', 'MULTIPLECHARVALUE'))
+# BeginString, BodyLength and MsgType must open the message in this order
+LEADING_TAGS = (8, 9, 35)
+
+class CompiledLayout():
+	# FieldLayout flattened for checking: position of every member, so ordering is one comparison per field
+	__slots__ = ('name', 'delim', 'positions', 'required', 'groups')
+
+	def __init__(self, layout: FieldLayout) -> None:
+		self.name = layout.name
+		self.delim = layout.delim
+		self.positions = {tag: position for position, tag in enumerate(layout.tags)}
+		self.required = frozenset(layout.required)
+		self.groups = {tag: CompiledLayout(group) for tag, group in layout.groups.items()}
+
+class MessageValidator():
+	# Checks parsed messages against the dictionaries in a single pass over their fields: required fields, unknown
+	# fields, header/body/trailer order, NumInGroup counts, group member order, enum values and numeric formats.
+	# Layouts are compiled once per message type and reused for every message.
+	def __init__(self, dictionary_set: DictionarySet) -> None:
+		self.dictionary_set = dictionary_set
+		transport = dictionary_set.transport
+		self.header = CompiledLayout(transport.header)
+		self.trailer = CompiledLayout(transport.trailer)
+		self.compiled = {}
+
+	def message_layout(self, msg_type: str) -> tuple:
+		# (compiled body layout or None, dictionary the body is defined in)
+		compiled = self.compiled.get(msg_type)
+		if compiled is None:
+			layout, fix_dict = self.dictionary_set.message_layout(msg_type)
+			compiled = self.compiled[msg_type] = (CompiledLayout(layout) if layout is not None else None, fix_dict)
+		return compiled
+
+	def field_problem(self, tag: int, value: str, fix_dict: FixDictionary) -> str:
+		if not value:
+			return 'Tag specified without a value'
+		if tag not in fix_dict.field_types:
+			fix_dict = self.dictionary_set.transport if fix_dict is self.dictionary_set.app else self.dictionary_set.app
+		field_type = fix_dict.field_types.get(tag)
+		if field_type is None:
+			return 'Invalid tag number'
+		enums = fix_dict.field_enums.get(tag)
+		if enums:
+			values = value.split(' ') if field_type in MULTIPLE_VALUE_TYPES else (value,)
+			for item in values:
+				if item not in enums:
+					return f"Value '{item}' is incorrect (out of range) for this tag"
+		elif field_type in INT_TYPES:
+			if not value.lstrip('-').isdigit():
+				return f'Incorrect data format for value, {field_type} expected'
+		elif field_type in FLOAT_TYPES:
+			try:
+				float(value)
+			except ValueError:
+				return f'Incorrect data format for value, {field_type} expected'
+		return None
+
+	def validate(self, message: CompactMessage) -> list:
+		issues = []
+		tags, parents, entries, sections = message.tags, message.parents, message.entries, message.sections
+		count = len(tags)
+		msg_type_index = message.find(35)
+		msg_type = message.value(msg_type_index) if msg_type_index >= 0 else None
+		body_layout, body_dict = self.message_layout(msg_type) if msg_type is not None else (None, self.dictionary_set.app)
+		transport = self.dictionary_set.transport
+		section_layouts = (self.header, body_layout, self.trailer)
+		section_dicts = (transport, body_dict, transport)
+		if msg_type is None:
+			issues.append(ValidationIssue('header', -1, None, 'Required tag missing: 35 MsgType'))
+		elif body_layout is None:
+			issues.append(ValidationIssue('header', msg_type_index, None, f"Invalid MsgType '{msg_type}'"))
+
+		for position, tag in enumerate(LEADING_TAGS):
+			if position >= count or tags[position] != tag:
+				issues.append(ValidationIssue('header', -1, None, f'Tag {tag} must be field {position + 1} of the message'))
+		if count and tags[count - 1] != 10:
+			issues.append(ValidationIssue(SECTIONS[sections[count - 1]], count - 1, None, 'CheckSum (10) must be the last field'))
+
+		# Per container: the fields seen so far and the position of the last one, containers are a section
+		# (-1, section) or a group entry (NumInGroup index, entry)
+		seen = {}
+		last_position = {}
+		group_layouts = {}
+		group_entries = {}
+		highest_section = HEADER
+		for index in range(count):
+			tag = tags[index]
+			section = sections[index]
+			parent = parents[index]
+			fix_dict = section_dicts[section]
+			if parent < 0:
+				container = (-1, section)
+				layout = section_layouts[section]
+				if section < highest_section:
+					issues.append(ValidationIssue(SECTIONS[section], index, None, f'Tag specified out of required order, {SECTIONS[section]} field after {SECTIONS[highest_section]} fields'))
+				highest_section = max(highest_section, section)
+			else:
+				container = (parent, entries[index])
+				layout = group_layouts.get(parent)
+				group_entries[parent] = max(group_entries.get(parent, 0), entries[index] + 1)
+
+			fields = seen.get(container)
+			if fields is None:
+				fields = seen[container] = set()
+			if tag in fields:
+				issues.append(ValidationIssue(SECTIONS[section], index, None, 'Tag appears more than once'))
+			fields.add(tag)
+
+			problem = self.field_problem(tag, message.value(index), fix_dict)
+			if problem:
+				issues.append(ValidationIssue(SECTIONS[section], index, None, problem))
+			if layout is None:
+				continue
+			position = layout.positions.get(tag)
+			if position is None:
+				if problem != 'Invalid tag number' and tag not in LEADING_TAGS:
+					issues.append(ValidationIssue(SECTIONS[section], index, None, 'Tag not defined for this message type' if parent < 0 else f'Tag not defined for group {layout.name}'))
+				continue
+			if parent >= 0:
+				# Group members have to keep the dictionary order, with the delimiter field first
+				if position < last_position.get(container, -1):
+					issues.append(ValidationIssue(SECTIONS[section], index, None, f'Out of order repeating group member in {layout.name}'))
+				last_position[container] = position
+			group = layout.groups.get(tag)
+			if group is not None:
+				group_layouts[index] = group
+				group_entries[index] = 0
+
+		for index in group_layouts:
+			value = message.value(index)
+			if not value.isdigit():
+				continue
+			if int(value) != group_entries[index]:
+				issues.append(ValidationIssue(SECTIONS[sections[index]], index, None, f'Incorrect NumInGroup count for repeating group, {value} declared but {group_entries[index]} found'))
+
+		for (parent, key), fields in seen.items():
+			if parent < 0:
+				layout = section_layouts[key]
+				section, entry = key, None
+			else:
+				layout = group_layouts.get(parent)
+				section, entry = sections[parent], key
+			if layout is None:
+				continue
+			for tag in sorted(layout.required - fields):
+				name = self.dictionary_set.field_name(tag, section_dicts[section])
+				issues.append(ValidationIssue(SECTIONS[section], parent, entry, f"Required tag missing: {tag}{' ' + name if name else ''}"))
+		for section in (HEADER, BODY, TRAILER):
+			if (-1, section) not in seen and section_layouts[section] is not None:
+				for tag in sorted(section_layouts[section].required):
+					name = self.dictionary_set.field_name(tag, section_dicts[section])
+					issues.append(ValidationIssue(SECTIONS[section], -1, None, f"Required tag missing: {tag}{' ' + name if name else ''}"))
+		return issues
+
+def issue_key(issue: ValidationIssue) -> tuple:
+	# What an issue is attached to: ('field', index), ('entry', NumInGroup index, entry) or ('section', name)
+	if issue.index < 0:
+		return ('section', issue.section)
+	if issue.entry is not None:
+		return ('entry', issue.index, issue.entry)
+	return ('field', issue.index)
+
+def issue_path(message: CompactMessage, issue: ValidationIssue) -> str:
+	# Locates an issue with the same paths as MessageParser.iter_tree_fields, e.g. body.453[1].448
+	if issue.index < 0:
+		return issue.section
+	path = message.field_path(issue.index)
+	if issue.entry is not None:
+		path = f'{path}[{issue.entry}]'
+	return f'{issue.section}.{path}'
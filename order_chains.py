@@ -0,0 +1,179 @@
+import heapq
+from collections import namedtuple
+from fix_stream import RawMessage
+
+# Messages taking part in the life of an order: NewOrderSingle, OrderCancelRequest, OrderCancelReplaceRequest,
+# OrderStatusRequest, ExecutionReport and OrderCancelReject
+ORDER_MSG_TYPES = frozenset(('D', 'F', 'G', 'H', '8', '9'))
+# OrdStatus after which an order gets no further executions: Filled, Canceled, Rejected, Expired
+TERMINAL_STATUSES = frozenset(('2', '4', '8', 'C'))
+# Placeholders sent for orders the other side does not know, they never link messages
+UNKNOWN_IDS = frozenset(('', 'NONE', 'UNKNOWN'))
+# ClOrdID, OrigClOrdID and OrderID link messages, ClOrdID and OrigClOrdID share one key space
+LINK_TAGS = {11: 'c', 41: 'c', 37: 'o'}
+ORDER_TAGS = frozenset(('35', '49', '56', '11', '41', '37', '17', '150', '39', '55', '54'))
+
+# One message of an order chain, number is its position in the tracked stream and source/offset locate it
+OrderEvent = namedtuple('OrderEvent', ['number', 'source', 'offset', 'msg_type', 'cl_ord_id', 'orig_cl_ord_id', 'order_id', 'exec_id', 'exec_type', 'ord_status'])
+
+def order_fields(msg: str, delim: str) -> dict:
+	# First value of each tag the tracker needs, read from the raw tokens without decoding the message
+	fields = {}
+	for token in msg.split(delim):
+		tag, _, value = token.partition('=')
+		if tag in ORDER_TAGS and tag not in fields:
+			fields[tag] = value.rstrip('\r\n')
+	return fields
+
+def session_key(sender: str, target: str) -> tuple:
+	# Orders and their execution reports travel in opposite directions, so both map to the same session
+	return (sender, target) if sender <= target else (target, sender)
+
+class OrderChain():
+	# Messages of one order from the first request to its final execution report, across replaces
+	__slots__ = ('chain_id', 'session', 'keys', 'events', 'symbol', 'side', 'ord_status', 'closed', 'duplicates')
+
+	def __init__(self, chain_id: int, session: tuple) -> None:
+		self.chain_id = chain_id
+		self.session = session
+		# Index keys pointing at the chain, dropped from the index once the order is done
+		self.keys = []
+		self.events = []
+		self.symbol = None
+		self.side = None
+		self.ord_status = None
+		self.closed = False
+		# Execution reports received again with an ExecID already seen, e.g. resends
+		self.duplicates = 0
+
+	def cl_ord_ids(self) -> list:
+		# ClOrdIDs in the order they were first used
+		ids = []
+		for event in self.events:
+			for cl_ord_id in (event.orig_cl_ord_id, event.cl_ord_id):
+				if cl_ord_id and cl_ord_id not in UNKNOWN_IDS and cl_ord_id not in ids:
+					ids.append(cl_ord_id)
+		return ids
+
+	def order_id(self) -> str:
+		for event in reversed(self.events):
+			if event.order_id and event.order_id not in UNKNOWN_IDS:
+				return event.order_id
+		return None
+
+	def to_dict(self) -> dict:
+		return {
+			'chain': self.chain_id,
+			'session': '/'.join(self.session),
+			'cl_ord_ids': self.cl_ord_ids(),
+			'order_id': self.order_id(),
+			'symbol': self.symbol,
+			'side': self.side,
+			'ord_status': self.ord_status,
+			'closed': self.closed,
+			'duplicates': self.duplicates,
+			'events': [{key: value for key, value in event._asdict().items() if value is not None} for event in self.events],
+		}
+
+class OrderTracker():
+	# Links order messages into chains in a single pass. Hash indexes map ClOrdID/OrigClOrdID, OrderID and ExecID
+	# (scoped by session) to the open chain they belong to, so each message costs a few lookups whatever the log size.
+	# A chain is handed out as soon as its order is done and forgotten, memory only grows with the open orders.
+	def __init__(self) -> None:
+		self.index = {}
+		self.open = {}
+		self.next_id = 0
+		self.message_count = 0
+
+	def add(self, fields: dict, source: str = None, offset: int = None) -> list:
+		# fields are {tag: value} with string tags as from order_fields, returns the chains this message closed
+		number = self.message_count
+		self.message_count += 1
+		msg_type = fields.get('35')
+		if msg_type not in ORDER_MSG_TYPES:
+			return []
+		session = session_key(fields.get('49', ''), fields.get('56', ''))
+		keys = []
+		for tag, kind in LINK_TAGS.items():
+			value = fields.get(str(tag))
+			if value is not None and value not in UNKNOWN_IDS:
+				keys.append((kind, session, value))
+		if not keys:
+			return []
+
+		exec_id = fields.get('17')
+		exec_key = ('x', session, exec_id) if exec_id else None
+		if exec_key is not None and exec_key in self.index:
+			self.index[exec_key].duplicates += 1
+			return []
+
+		chain = None
+		for key in keys:
+			found = self.index.get(key)
+			if found is None or found is chain:
+				continue
+			# A message naming ids of two chains, e.g. an OrderID first seen on another ClOrdID, joins them
+			chain = found if chain is None else self.merge(chain, found)
+		if chain is None:
+			chain = OrderChain(self.next_id, session)
+			self.next_id += 1
+			self.open[chain.chain_id] = chain
+
+		if exec_key is not None:
+			keys.append(exec_key)
+		for key in keys:
+			if key not in self.index:
+				self.index[key] = chain
+				chain.keys.append(key)
+
+		ord_status = fields.get('39')
+		chain.events.append(OrderEvent(number, source, offset, msg_type, fields.get('11'), fields.get('41'), fields.get('37'), exec_id, fields.get('150'), ord_status))
+		if chain.symbol is None:
+			chain.symbol = fields.get('55')
+		if chain.side is None:
+			chain.side = fields.get('54')
+		if msg_type == '8' and ord_status is not None:
+			chain.ord_status = ord_status
+			if ord_status in TERMINAL_STATUSES:
+				self.close(chain)
+				return [chain]
+		return []
+
+	def add_message(self, message: RawMessage, source: str = None) -> list:
+		return self.add(order_fields(message.text, message.delim), source, message.offset)
+
+	def add_messages(self, messages, source: str = None) -> list:
+		closed = []
+		for message in messages:
+			closed.extend(self.add_message(message, source))
+		return closed
+
+	def merge(self, chain: OrderChain, other: OrderChain) -> OrderChain:
+		# The chain with fewer keys moves into the other one, so only its index entries are re-pointed
+		if len(chain.keys) < len(other.keys):
+			chain, other = other, chain
+		for key in other.keys:
+			self.index[key] = chain
+		chain.keys.extend(other.keys)
+		chain.events = list(heapq.merge(chain.events, other.events, key=lambda event: event.number))
+		chain.symbol = chain.symbol if chain.symbol is not None else other.symbol
+		chain.side = chain.side if chain.side is not None else other.side
+		chain.duplicates += other.duplicates
+		del self.open[other.chain_id]
+		return chain
+
+	def close(self, chain: OrderChain):
+		chain.closed = True
+		for key in chain.keys:
+			del self.index[key]
+		chain.keys = []
+		del self.open[chain.chain_id]
+
+	def flush(self) -> list:
+		# Orders still open at the end of the input, oldest first, the tracker is empty afterwards
+		chains = sorted(self.open.values(), key=lambda chain: chain.chain_id)
+		self.index.clear()
+		self.open.clear()
+		for chain in chains:
+			chain.keys = []
+		return chains
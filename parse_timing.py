@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+from collections import deque
+
+PERCENTILES = (50, 90, 99)
+
+class StageTimer():
+	# Accumulates per stage durations of the sample being measured on the current thread,
+	# and keeps a rolling window of finished samples for percentiles
+	def __init__(self, window: int = 1000) -> None:
+		self.window = window
+		self.local = threading.local()
+		self.samples = {}
+		self.lock = threading.Lock()
+
+	def start(self):
+		self.local.stages = {}
+		self.local.last = time.perf_counter()
+
+	def mark(self, stage: str):
+		now = time.perf_counter()
+		stages = getattr(self.local, 'stages', None)
+		if stages is None:
+			# Stage reached outside of a measured decode
+			return
+		stages[stage] = stages.get(stage, 0.0) + now - self.local.last
+		self.local.last = now
+
+	def finish(self) -> dict:
+		stages = self.local.stages
+		self.local.stages = None
+		self.local.last_sample = stages
+		self.record(stages)
+		return stages
+
+	def last_sample(self) -> dict:
+		return getattr(self.local, 'last_sample', None)
+
+	def record(self, stages: dict):
+		with self.lock:
+			for stage, seconds in stages.items():
+				if stage not in self.samples:
+					self.samples[stage] = deque(maxlen=self.window)
+				self.samples[stage].append(seconds)
+
+	def clear(self):
+		with self.lock:
+			self.samples.clear()
+
+	def percentiles(self) -> dict:
+		with self.lock:
+			samples = {stage: sorted(values) for stage, values in self.samples.items()}
+		summary = {}
+		for stage, values in samples.items():
+			stage_summary = {'count': len(values), 'mean_ms': sum(values) / len(values) * 1000}
+			for percentile in PERCENTILES:
+				index = min(len(values) - 1, int(len(values) * percentile / 100))
+				stage_summary[f'p{percentile}_ms'] = values[index] * 1000
+			stage_summary['max_ms'] = values[-1] * 1000
+			summary[stage] = stage_summary
+		return summary
+
+	def export(self, path: str):
+		with open(path, 'w') as export_file:
+			json.dump({'window': self.window, 'stages': self.percentiles()}, export_file, indent=2)
+
+def format_stages(stages: dict) -> str:
+	return ', '.join(f'{stage} {seconds * 1000:.2f} ms' for stage, seconds in stages.items())
@@ -0,0 +1,39 @@
+import time
+from PyQt6 import QtCore
+
+class ParserLoadWorker(QtCore.QObject):
+	# Builds the message parser on its own thread so the window is shown before any dictionary is loaded
+	progress = QtCore.pyqtSignal(str)
+	# (message parser, seconds it took)
+	loaded = QtCore.pyqtSignal(object, float)
+	failed = QtCore.pyqtSignal(str)
+
+	def __init__(self, build_parser) -> None:
+		super().__init__()
+		self.build_parser = build_parser
+
+	@QtCore.pyqtSlot()
+	def load(self):
+		start = time.perf_counter()
+		self.progress.emit('Loading dictionaries...')
+		try:
+			msg_parser = self.build_parser()
+		except Exception as error:
+			self.failed.emit(f'[{type(error).__name__}Error] {error}')
+			return
+		# Other versions the registry routes to are loaded when their first message is decoded
+		self.loaded.emit(msg_parser, time.perf_counter() - start)
+
+class ParserLoader():
+	def __init__(self, build_parser) -> None:
+		self.thread = QtCore.QThread()
+		self.worker = ParserLoadWorker(build_parser)
+		self.worker.moveToThread(self.thread)
+		self.thread.started.connect(self.worker.load)
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.thread.quit()
+		self.thread.wait()
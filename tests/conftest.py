@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+basedir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, basedir)
+
+from message_parser import MessageParser
+from fix_dictionary import DictionaryRegistry
+
+DICTIONARY_DIR = os.path.join(basedir, 'dictionaries')
+
+@pytest.fixture
+def fix44_parser(tmp_path) -> MessageParser:
+	return MessageParser(os.path.join(DICTIONARY_DIR, 'FIX44.xml'), cache_dir=str(tmp_path))
+
+@pytest.fixture
+def registry_parser(tmp_path) -> MessageParser:
+	# Picks the dictionaries per message, FIXT11/FIX50SP2 are the fallback as configured by default
+	registry = DictionaryRegistry.from_directory(DICTIONARY_DIR, 'FIX50SP2', str(tmp_path))
+	return MessageParser(os.path.join(DICTIONARY_DIR, 'FIXT11.xml'), os.path.join(DICTIONARY_DIR, 'FIX50SP2.xml'), cache_dir=str(tmp_path), registry=registry)
@@ -0,0 +1,6 @@
+import fixv_cli
+
+def test_missing_input_is_reported(tmp_path, capsys):
+	missing = str(tmp_path / 'missing.log')
+	assert fixv_cli.main(['-j', '1', missing]) == 2
+	assert capsys.readouterr().err == f'fixv: cannot read {missing}: No such file or directory\n'
@@ -0,0 +1,20 @@
+from fix_query import FixQuery
+from fix_stream import detect_delimiter
+from message_history import MessageHistory
+from message_parser import DecodedMessage
+
+ORDER = '8=FIX.4.4|9=60|35=D|49=BUY|56=SELL|11=ORD1|55=IBM|54=1|38=100|40=1|10=000|'
+
+def add_paste(history: MessageHistory, msg_parser, raw: str):
+	# A single paste is stored as the viewer does, with the delimiter the message uses
+	delim = detect_delimiter(raw, '|')
+	return history.add(DecodedMessage(0, raw, delim, msg_parser.parse_msg(raw, delim), None))
+
+def test_search_query_finds_soh_paste(fix44_parser):
+	history = MessageHistory()
+	add_paste(history, fix44_parser, ORDER)
+	add_paste(history, fix44_parser, ORDER.replace('|', '\x01').replace('ORD1', 'ORD2'))
+	query = FixQuery('55=IBM')
+	assert [decoded.raw.count('\x01') > 0 for decoded in history.search_query(query)] == [False, True]
+	soh = history.search_query(FixQuery('11=ORD2'))
+	assert len(soh) == 1 and soh[0].delim == '\x01'
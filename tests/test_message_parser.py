@@ -0,0 +1,32 @@
+import pytest
+from message_parser import MessageParser
+from parse_timing import StageTimer
+
+FIX42_ORDER = '8=FIX.4.2|9=60|35=D|49=BUY|56=SELL|11=ORD1|21=1|55=IBM|54=1|60=20240101-00:00:00|40=1|47=A|10=000|'
+
+def field(msg_tree, tag: int):
+	return next(elem for elem in msg_tree.iter('field') if elem.get('number') == str(tag))
+
+@pytest.mark.parametrize('prefix', ['', ' ', '\t ', '\n'])
+def test_peek_version_skips_leading_whitespace(prefix):
+	assert MessageParser.peek_version(prefix + FIX42_ORDER, '|') == ('FIX.4.2', None)
+
+@pytest.mark.parametrize('delim', ['|', '\x01'])
+def test_registry_selects_version_with_leading_whitespace(registry_parser, delim):
+	msg = ' ' + FIX42_ORDER.replace('|', delim)
+	assert field(registry_parser.parse_msg(msg, delim), 47).get('name') == 'Rule80A'
+
+def test_batch_messages_validate_like_single_pastes(fix44_parser):
+	# The viewer validates list selections from compact batch decodes, they must report what validate_msg does
+	msg = FIX42_ORDER.replace('FIX.4.2', 'FIX.4.4').replace('54=1', '54=9')
+	_, expected = fix44_parser.validate_msg(msg, '|')
+	decoded, = fix44_parser.parse_many([msg], compact=True)
+	assert expected and fix44_parser.validate_compact(decoded.tree) == expected
+
+def test_untimed_parser_leaves_timings_alone(fix44_parser):
+	fix44_parser.stage_timer = StageTimer()
+	msg = FIX42_ORDER.replace('FIX.4.2', 'FIX.4.4')
+	list(fix44_parser.untimed().parse_many([msg] * 3, compact=True))
+	assert not fix44_parser.stage_timer.samples
+	fix44_parser.parse_msg(msg, '|')
+	assert fix44_parser.stage_timer.samples